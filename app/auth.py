@@ -1,7 +1,11 @@
 """JWT authentication utilities."""
 
+import hashlib
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Optional
+from cachetools import TTLCache
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -15,6 +19,11 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # JWT token scheme
 security = HTTPBearer()
 
+# Recently verified tokens, keyed by SHA-256 of the token; a hit skips the
+# signature check but still honours "exp"
+_TOKEN_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=10)
+_TOKEN_CACHE_LOCK = threading.Lock()
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
@@ -44,14 +53,33 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 
 def verify_token(token: str) -> Optional[dict]:
-    """Verify and decode a JWT token."""
+    """Verify and decode a JWT token (recent results are cached briefly)."""
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    with _TOKEN_CACHE_LOCK:
+        payload = _TOKEN_CACHE.get(key)
+    if payload is not None:
+        exp = payload.get("exp")
+        if exp is None or exp > time.time():
+            return payload
+        with _TOKEN_CACHE_LOCK:
+            _TOKEN_CACHE.pop(key, None)
+        return None
+
     try:
         payload = jwt.decode(
             token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm]
         )
-        return payload
     except JWTError:
         return None
+    with _TOKEN_CACHE_LOCK:
+        _TOKEN_CACHE[key] = payload
+    return payload
+
+
+def clear_token_cache() -> None:
+    """Forget verified tokens (e.g. after rotating the signing key)."""
+    with _TOKEN_CACHE_LOCK:
+        _TOKEN_CACHE.clear()
 
 
 def authenticate_user(username: str, password: str) -> bool:
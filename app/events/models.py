@@ -15,7 +15,6 @@ class Event(Base):
         Integer,
         ForeignKey("students.id", ondelete="CASCADE"),
         nullable=False,
-        index=True,
     )
     status = Column(String(20), nullable=False)
     latitude = Column(DECIMAL(10, 8), nullable=False)
@@ -24,4 +23,6 @@ class Event(Base):
         Integer, ForeignKey("geofences.id", ondelete="SET NULL"), nullable=True
     )
     method = Column(String(20), nullable=False)
+    # client Idempotency-Key of the presence check; unique per student
+    idempotency_key = Column(String(255), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -58,17 +58,22 @@ class EventResponse(EventBase):
     student_id: int
     created_at: datetime
 
-    # pydantic v2 config
-    model_config = ConfigDict(from_attributes=True)
+    # pydantic v2 config; keep enum fields as their plain string values
+    model_config = ConfigDict(from_attributes=True, use_enum_values=True)
 
 
 class EventListResponse(BaseModel):
     """Schema for event list response."""
 
     events: List[EventResponse]
-    total: int
+    total: Optional[int] = Field(
+        ..., description="Nombre total d'événements (null si non demandé)"
+    )
     limit: int
     offset: int
+    next_cursor: Optional[str] = Field(
+        None, description="Curseur de la page suivante (pagination par clé)"
+    )
 
 
 class EventQueryParams(BaseModel):
@@ -1,13 +1,145 @@
 """Business logic for events."""
 
-from typing import List, Tuple, Optional, Dict, Any
+import base64
+import csv
+import io
+import threading
+from typing import List, Tuple, Optional, Dict, Any, Iterator, Mapping, Sequence
+from cachetools import TTLCache
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from datetime import datetime, date
-from fastapi import HTTPException
+from fastapi import Depends, HTTPException
+
+from db import get_db
 
 from events.schemas import EventCreate
 
+# Short-lived list totals keyed by filters, so paging through the same
+# result set does not recount it on every click
+_COUNT_CACHE: TTLCache = TTLCache(maxsize=256, ttl=5)
+_COUNT_CACHE_LOCK = threading.Lock()
+
+# Fixed statements are built once at import and reused by every call
+_INSERT_EVENT_SQL = text(
+    """
+    INSERT INTO events (student_id, status, latitude, longitude, geofence_id, method)
+    VALUES (:student_id, :status, :latitude, :longitude, :geofence_id, :method)
+    RETURNING id, student_id, status,
+              latitude::float8 AS latitude, longitude::float8 AS longitude,
+              geofence_id, method, created_at
+    """
+)
+
+# Pre-aggregated row kept up to date by events_stats_trg
+_DAILY_STATS_SQL = text(
+    """
+    SELECT total_events, present_count, late_count, absent_count,
+           outside_count, manual_count, auto_count
+    FROM events_daily_stats
+    WHERE day = :target_date
+    """
+)
+
+_GET_EVENT_BY_ID_SQL = text(
+    """
+    SELECT 
+        e.id, e.student_id, e.status,
+        e.latitude::float8 as latitude, e.longitude::float8 as longitude,
+        e.geofence_id, e.method, e.created_at,
+        s.matricule as student_matricule,
+        s.nom as student_nom,
+        s.prenom as student_prenom,
+        g.name as geofence_name
+    FROM events e
+    JOIN students s ON e.student_id = s.id
+    LEFT JOIN geofences g ON e.geofence_id = g.id
+    WHERE e.id = :event_id
+    """
+)
+
+# Rows fetched per round trip when streaming events
+_STREAM_BATCH_SIZE = 100
+
+EXPORT_COLUMNS = (
+    "id",
+    "created_at",
+    "student_matricule",
+    "student_nom",
+    "student_prenom",
+    "status",
+    "method",
+    "latitude",
+    "longitude",
+    "geofence_id",
+    "geofence_name",
+)
+
+
+def _cached_total(key: tuple) -> Optional[int]:
+    with _COUNT_CACHE_LOCK:
+        return _COUNT_CACHE.get(key)
+
+
+def _store_total(key: tuple, total: int) -> None:
+    with _COUNT_CACHE_LOCK:
+        _COUNT_CACHE[key] = total
+
+
+def _filter_conditions(
+    matricule: Optional[str],
+    from_date: Optional[datetime],
+    to_date: Optional[datetime],
+) -> Tuple[List[str], Dict[str, Any]]:
+    """Build the WHERE conditions and params shared by event listings."""
+    conditions = []
+    params: Dict[str, Any] = {}
+
+    if matricule:
+        conditions.append("s.matricule = :matricule")
+        params["matricule"] = matricule
+
+    if from_date:
+        conditions.append("e.created_at >= :from_date")
+        params["from_date"] = from_date
+
+    if to_date:
+        conditions.append("e.created_at <= :to_date")
+        params["to_date"] = to_date
+
+    return conditions, params
+
+
+def _students_join(matricule: Optional[str]) -> str:
+    """Join students only when it is needed to filter on matricule."""
+    return "JOIN students s ON e.student_id = s.id" if matricule else ""
+
+
+def _count_query(matricule: Optional[str], where_clause: str) -> str:
+    """SQL counting the events matched by the list filters."""
+    return f"""
+        SELECT COUNT(*) as total
+        FROM events e
+        {_students_join(matricule)}
+        {where_clause}
+    """
+
+
+def encode_cursor(created_at: datetime, event_id: int) -> str:
+    """Encode a (created_at, id) keyset position as an opaque cursor."""
+    raw = f"{created_at.isoformat()}|{event_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, event_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(event_id)
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+
 
 class EventService:
     """Service class for event operations."""
@@ -19,13 +151,7 @@ class EventService:
         """Create a new event."""
         try:
             result = self.db.execute(
-                text(
-                    """
-                INSERT INTO events (student_id, status, latitude, longitude, geofence_id, method)
-                VALUES (:student_id, :status, :latitude, :longitude, :geofence_id, :method)
-                RETURNING id, created_at
-            """
-                ),
+                _INSERT_EVENT_SQL,
                 {
                     "student_id": event_data.student_id,
                     "status": event_data.status.value,
@@ -36,19 +162,9 @@ class EventService:
                 },
             )
 
-            new_event = result.fetchone()
+            new_event = dict(result.mappings().first())
             self.db.commit()
-
-            return {
-                "id": new_event.id,
-                "student_id": event_data.student_id,
-                "status": event_data.status.value,
-                "latitude": float(event_data.latitude),
-                "longitude": float(event_data.longitude),
-                "geofence_id": event_data.geofence_id,
-                "method": event_data.method.value,
-                "created_at": new_event.created_at,
-            }
+            return new_event
 
         except Exception as e:
             self.db.rollback()
@@ -64,42 +180,106 @@ class EventService:
         to_date: Optional[datetime] = None,
         limit: int = 50,
         offset: int = 0,
-    ) -> Tuple[List[Dict[str, Any]], int]:
-        """Get events with filtering and pagination."""
-        # Build query conditions
-        conditions = []
-        params = {"limit": limit, "offset": offset}
-
-        if matricule:
-            conditions.append("s.matricule = :matricule")
-            params["matricule"] = matricule
-
-        if from_date:
-            conditions.append("e.created_at >= :from_date")
-            params["from_date"] = from_date
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+    ) -> Tuple[Sequence[Mapping[str, Any]], Optional[int]]:
+        """
+        Get events with filtering and pagination.
 
-        if to_date:
-            conditions.append("e.created_at <= :to_date")
-            params["to_date"] = to_date
+        When a cursor is given, the page starts right after the cursor
+        position (keyset pagination) and offset is ignored. With
+        include_total=False the count is skipped and total is None.
+        """
+        conditions, params = _filter_conditions(matricule, from_date, to_date)
+        params.update({"limit": limit, "offset": offset})
 
         where_clause = ""
         if conditions:
             where_clause = "WHERE " + " AND ".join(conditions)
 
-        # Get total count
-        count_query = f"""
-            SELECT COUNT(*) as total
+        # Keyset predicate only applies to the page, not to the total
+        page_conditions = list(conditions)
+        pagination_clause = "LIMIT :limit OFFSET :offset"
+        if cursor:
+            before_created_at, before_id = decode_cursor(cursor)
+            page_conditions.append(
+                "(e.created_at, e.id) < (:before_created_at, :before_id)"
+            )
+            params["before_created_at"] = before_created_at
+            params["before_id"] = before_id
+            pagination_clause = "LIMIT :limit"
+
+        page_where_clause = ""
+        if page_conditions:
+            page_where_clause = "WHERE " + " AND ".join(page_conditions)
+
+        total_key = (matricule, from_date, to_date)
+        total = _cached_total(total_key) if include_total else None
+        # The total comes back alongside the rows so that the page and the
+        # count cost a single round trip: offset pages use a window
+        # function; keyset pages are narrowed by the cursor, so they use an
+        # uncorrelated subquery that the planner evaluates once.
+        fetch_total = include_total and total is None
+        total_column = ""
+        if fetch_total and cursor:
+            count_sql = _count_query(matricule, where_clause)
+            total_column = f", ({count_sql}) as total"
+        elif fetch_total:
+            total_column = ", COUNT(*) OVER () as total"
+
+        # Only the EventResponse columns: the list response drops student
+        # and geofence details, so students is joined just for the filter.
+        # DECIMAL coordinates are cast in SQL so the driver returns floats.
+        events_query = f"""
+            SELECT 
+                e.id, e.student_id, e.status,
+                e.latitude::float8 as latitude,
+                e.longitude::float8 as longitude,
+                e.geofence_id, e.method, e.created_at
+                {total_column}
             FROM events e
-            JOIN students s ON e.student_id = s.id
-            {where_clause}
+            {_students_join(matricule)}
+            {page_where_clause}
+            ORDER BY e.created_at DESC, e.id DESC
+            {pagination_clause}
         """
-        total_result = self.db.execute(text(count_query), params).fetchone()
-        total = total_result.total if total_result else 0
 
-        # Get events with student and geofence information
+        # Row mappings go straight to EventResponse, no per-row dict copy
+        events = self.db.execute(text(events_query), params).mappings().all()
+
+        if fetch_total:
+            if events:
+                total = events[0]["total"]
+                _store_total(total_key, total)
+            elif offset or cursor:
+                # Past the last page: no row to read the total from
+                total = self._count_events(total_key, where_clause, params)
+            else:
+                total = 0
+
+        return events, total
+
+    def iter_events(
+        self,
+        matricule: Optional[str] = None,
+        from_date: Optional[datetime] = None,
+        to_date: Optional[datetime] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream every event matching the filters, newest first.
+
+        Rows are fetched through a server-side cursor in batches, so memory
+        stays bounded by the batch size rather than the number of events.
+        """
+        conditions, params = _filter_conditions(matricule, from_date, to_date)
+        where_clause = ""
+        if conditions:
+            where_clause = "WHERE " + " AND ".join(conditions)
+
         events_query = f"""
             SELECT 
-                e.id, e.student_id, e.status, e.latitude, e.longitude, 
+                e.id, e.student_id, e.status,
+                e.latitude::float8 as latitude, e.longitude::float8 as longitude,
                 e.geofence_id, e.method, e.created_at,
                 s.matricule as student_matricule,
                 s.nom as student_nom,
@@ -109,49 +289,57 @@ class EventService:
             JOIN students s ON e.student_id = s.id
             LEFT JOIN geofences g ON e.geofence_id = g.id
             {where_clause}
-            ORDER BY e.created_at DESC
-            LIMIT :limit OFFSET :offset
+            ORDER BY e.created_at DESC, e.id DESC
         """
+        result = self.db.execute(
+            text(events_query),
+            params,
+            execution_options={
+                "stream_results": True,
+                "yield_per": _STREAM_BATCH_SIZE,
+            },
+        )
+        for row in result.mappings():
+            yield dict(row)
 
-        events = self.db.execute(text(events_query), params).fetchall()
-
-        return [
-            {
-                "id": event.id,
-                "student_id": event.student_id,
-                "status": event.status,
-                "latitude": float(event.latitude),
-                "longitude": float(event.longitude),
-                "geofence_id": event.geofence_id,
-                "method": event.method,
-                "created_at": event.created_at,
-                "student_matricule": event.student_matricule,
-                "student_nom": event.student_nom,
-                "student_prenom": event.student_prenom,
-                "geofence_name": event.geofence_name,
-            }
-            for event in events
-        ], total
+    def iter_events_csv(
+        self,
+        matricule: Optional[str] = None,
+        from_date: Optional[datetime] = None,
+        to_date: Optional[datetime] = None,
+    ) -> Iterator[str]:
+        """Stream the filtered events as CSV text, one chunk per batch."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+
+        for idx, event in enumerate(
+            self.iter_events(matricule, from_date, to_date), start=1
+        ):
+            writer.writerow([event[column] for column in EXPORT_COLUMNS])
+            if idx % _STREAM_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        yield buffer.getvalue()
+
+    def _count_events(
+        self, total_key: tuple, where_clause: str, params: Dict[str, Any]
+    ) -> int:
+        """Count events matching the list filters and cache the result."""
+        count_query = _count_query(total_key[0], where_clause)
+        total_result = self.db.execute(text(count_query), params).fetchone()
+        total = total_result.total if total_result else 0
+
+        _store_total(total_key, total)
+        return total
 
     def get_daily_stats(self, target_date: date) -> Dict[str, Any]:
         """Get daily statistics for a specific date."""
         try:
-            # Get statistics for the specified date
-            stats_query = """
-                SELECT 
-                    COUNT(*) as total_events,
-                    COUNT(CASE WHEN status = 'present' THEN 1 END) as present_count,
-                    COUNT(CASE WHEN status = 'late' THEN 1 END) as late_count,
-                    COUNT(CASE WHEN status = 'absent' THEN 1 END) as absent_count,
-                    COUNT(CASE WHEN status = 'outside' THEN 1 END) as outside_count,
-                    COUNT(CASE WHEN method = 'manual' THEN 1 END) as manual_count,
-                    COUNT(CASE WHEN method = 'auto' THEN 1 END) as auto_count
-                FROM events
-                WHERE DATE(created_at) = :target_date
-            """
-
             result = self.db.execute(
-                text(stats_query), {"target_date": target_date}
+                _DAILY_STATS_SQL, {"target_date": target_date}
             ).fetchone()
 
             if not result:
@@ -185,39 +373,14 @@ class EventService:
 
     def get_event_by_id(self, event_id: int) -> Optional[Dict[str, Any]]:
         """Get event by ID with student and geofence information."""
-        result = self.db.execute(
-            text(
-                """
-            SELECT 
-                e.id, e.student_id, e.status, e.latitude, e.longitude, 
-                e.geofence_id, e.method, e.created_at,
-                s.matricule as student_matricule,
-                s.nom as student_nom,
-                s.prenom as student_prenom,
-                g.name as geofence_name
-            FROM events e
-            JOIN students s ON e.student_id = s.id
-            LEFT JOIN geofences g ON e.geofence_id = g.id
-            WHERE e.id = :event_id
-        """
-            ),
-            {"event_id": event_id},
-        ).fetchone()
-
-        if not result:
-            return None
-
-        return {
-            "id": result.id,
-            "student_id": result.student_id,
-            "status": result.status,
-            "latitude": float(result.latitude),
-            "longitude": float(result.longitude),
-            "geofence_id": result.geofence_id,
-            "method": result.method,
-            "created_at": result.created_at,
-            "student_matricule": result.student_matricule,
-            "student_nom": result.student_nom,
-            "student_prenom": result.student_prenom,
-            "geofence_name": result.geofence_name,
-        }
+        row = (
+            self.db.execute(_GET_EVENT_BY_ID_SQL, {"event_id": event_id})
+            .mappings()
+            .first()
+        )
+        return dict(row) if row else None
+
+
+def get_event_service(db: Session = Depends(get_db)) -> EventService:
+    """FastAPI dependency providing an EventService bound to the request session."""
+    return EventService(db)
@@ -1,9 +1,13 @@
 """Unit tests for events functionality."""
 
+from datetime import datetime
 from unittest.mock import Mock
 
+import pytest
+from fastapi import HTTPException
+
 from events.schemas import EventStatus, EventMethod, EventCreate, DailyStatsResponse
-from .service import EventService
+from .service import EventService, encode_cursor, decode_cursor
 
 
 class TestEventSchemas:
@@ -85,3 +89,52 @@ class TestEventService:
         mock_db = Mock()
         service = EventService(mock_db)
         assert service.db == mock_db
+
+    def test_iter_events_csv(self):
+        """Test CSV export layout from streamed events."""
+        service = EventService(Mock())
+        service.iter_events = Mock(
+            return_value=iter(
+                [
+                    {
+                        "id": 1,
+                        "created_at": datetime(2023, 1, 15, 8, 5),
+                        "student_matricule": "STU001",
+                        "student_nom": "Dupont",
+                        "student_prenom": "Jean",
+                        "status": "present",
+                        "method": "auto",
+                        "latitude": 48.8566,
+                        "longitude": 2.3522,
+                        "geofence_id": 1,
+                        "geofence_name": "Campus Principal",
+                    }
+                ]
+            )
+        )
+
+        lines = "".join(service.iter_events_csv()).splitlines()
+
+        assert lines[0].startswith("id,created_at,student_matricule")
+        assert lines[1] == (
+            "1,2023-01-15 08:05:00,STU001,Dupont,Jean,present,auto,"
+            "48.8566,2.3522,1,Campus Principal"
+        )
+        assert len(lines) == 2
+
+
+class TestEventCursor:
+    """Test cases for keyset pagination cursors."""
+
+    def test_cursor_round_trip(self):
+        """Test that a cursor decodes to the position it was built from."""
+        created_at = datetime(2023, 1, 15, 8, 5, 30, 123456)
+        cursor = encode_cursor(created_at, 42)
+
+        assert decode_cursor(cursor) == (created_at, 42)
+
+    def test_decode_invalid_cursor(self):
+        """Test that a malformed cursor is rejected with a 400."""
+        with pytest.raises(HTTPException) as exc_info:
+            decode_cursor("not-a-cursor")
+        assert exc_info.value.status_code == 400
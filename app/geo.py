@@ -1,123 +1,113 @@
 """Geospatial utilities for PostGIS operations (geography)."""
 
-from typing import Optional, Tuple
+import itertools
+import threading
+from typing import List, Optional, Tuple
+from cachetools import TTLCache
+from shapely import wkb
+from shapely.geometry import Point, Polygon
+from shapely.strtree import STRtree
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
+from settings import settings
 
-def create_point_geography(lat: float, lon: float) -> str:
+# "Latest active" lookups change only on admin writes; keep them briefly in
+# memory. Write endpoints call clear_active_cache() for immediate effect.
+_ACTIVE_CACHE = TTLCache(maxsize=8, ttl=settings.geo_cache_ttl_seconds)
+_ACTIVE_CACHE_LOCK = threading.Lock()
+_MISSING = object()
+
+# Statements are built once at import and reused by every call
+_ACTIVE_GEOFENCES_SQL = text(
     """
-    Return a WKT POINT string in lon/lat order.
-    Use it with ST_GeogFromText(:point) in queries.
+    SELECT id, name, ST_AsBinary(polygon) AS polygon
+    FROM geofences
+    WHERE is_active = true
+    ORDER BY updated_at DESC
     """
-    return f"POINT({lon} {lat})"
-
+)
 
-def check_point_in_geofence(
-    db: Session, lat: float, lon: float, geofence_id: int
-) -> bool:
+_ACTIVE_TIME_WINDOW_SQL = text(
     """
-    Check if a point is inside (or within margin_m meters of) a geofence.
-
-    Uses ST_DWithin on geography:
-      - distance == 0       → strictly inside polygon
-      - distance <= margin  → inside or close to boundary by margin_m meters
+    SELECT id, name
+    FROM time_windows
+    WHERE is_active = true
+      AND CURRENT_TIME BETWEEN start_time AND end_time
+    ORDER BY start_time
+    LIMIT 1
     """
-    row = db.execute(
-        text(
-            """
-            SELECT ST_DWithin(
-                     polygon,                   -- geography polygon
-                     ST_GeogFromText(:point),  -- geography point (lon lat)
-                     COALESCE(margin_m, 0)     -- meters
-                   ) AS inside
-            FROM geofences
-            WHERE id = :geofence_id
-              AND is_active = true
-            """
-        ),
-        {"point": create_point_geography(lat, lon), "geofence_id": geofence_id},
-    ).fetchone()
-
-    return bool(row and row.inside)
-
-
-def get_active_geofence(db: Session) -> Optional[Tuple[int, str]]:
-    """Get the latest active geofence (single selection)."""
-    row = db.execute(
-        text(
-            """
-            SELECT id, name
-            FROM geofences
-            WHERE is_active = true
-            ORDER BY created_at DESC
-            LIMIT 1
-            """
-        )
-    ).fetchone()
-    return (row.id, row.name) if row else None
+)
+
+
+def _cached(key: str, load):
+    """Return the cached value for key, calling load() on a miss."""
+    with _ACTIVE_CACHE_LOCK:
+        value = _ACTIVE_CACHE.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    value = load()
+    with _ACTIVE_CACHE_LOCK:
+        _ACTIVE_CACHE[key] = value
+    return value
+
+
+def _cached_lookup(key: str, db: Session, statement) -> Optional[Tuple[int, str]]:
+    """Run a single-row (id, name) lookup through the active cache."""
+
+    def load():
+        row = db.execute(statement).fetchone()
+        return (row.id, row.name) if row else None
+
+    return _cached(key, load)
 
 
-def get_active_geofence_for_point(
+def clear_active_cache() -> None:
+    """Drop cached active geofence / time window lookups."""
+    with _ACTIVE_CACHE_LOCK:
+        _ACTIVE_CACHE.clear()
+
+
+def _geofence_index(db: Session) -> Tuple[List[Tuple[int, str, Polygon]], STRtree]:
+    """Cached active geofences plus an STRtree over their polygons."""
+
+    def load():
+        rows = db.execute(_ACTIVE_GEOFENCES_SQL).fetchall()
+        geofences = [(r.id, r.name, wkb.loads(bytes(r.polygon))) for r in rows]
+        return geofences, STRtree([polygon for _, _, polygon in geofences])
+
+    return _cached("geofences", load)
+
+
+def get_containing_geofence(
     db: Session, lat: float, lon: float
 ) -> Optional[Tuple[int, str]]:
     """
-    Pick the active geofence that contains the point (or the nearest if none contains it).
+    Find the active geofence covering the point, in process.
 
-    1) Prefer a polygon that contains the point (ST_DWithin with 0m on geography).
-    2) Otherwise choose the nearest active polygon by edge distance.
+    The STRtree bounding-box prefilter narrows the cached polygons before the
+    exact test (planar lon/lat, which matches the geography test for
+    campus-sized areas). When several cover the point the most recently
+    updated wins. Returns None when none covers it; nearest-geofence
+    selection is left to the database.
     """
-    point = create_point_geography(lat, lon)
-
-    # 1) contains (distance == 0)
-    inside = db.execute(
-        text(
-            """
-            SELECT id, name
-            FROM geofences
-            WHERE is_active = true
-              AND ST_DWithin(polygon, ST_GeogFromText(:point), 0)
-            ORDER BY updated_at DESC
-            LIMIT 1
-            """
-        ),
-        {"point": point},
-    ).fetchone()
-    if inside:
-        return (inside.id, inside.name)
-
-    # 2) nearest if none contains
-    nearest = db.execute(
-        text(
-            """
-            SELECT id, name
-            FROM geofences
-            WHERE is_active = true
-            ORDER BY ST_Distance(polygon, ST_GeogFromText(:point)) ASC
-            LIMIT 1
-            """
-        ),
-        {"point": point},
-    ).fetchone()
-
-    return (nearest.id, nearest.name) if nearest else None
+    geofences, tree = _geofence_index(db)
+    hits = tree.query(Point(lon, lat), predicate="covered_by")
+    if len(hits) == 0:
+        return None
+    geofence_id, name, _ = geofences[int(hits.min())]
+    return geofence_id, name
 
 
 def get_active_time_window(db: Session) -> Optional[Tuple[int, str]]:
-    """Get the currently active time window based on current server time."""
-    row = db.execute(
-        text(
-            """
-            SELECT id, name
-            FROM time_windows
-            WHERE is_active = true
-              AND CURRENT_TIME BETWEEN start_time AND end_time
-            ORDER BY start_time
-            LIMIT 1
-            """
-        )
-    ).fetchone()
-    return (row.id, row.name) if row else None
+    """
+    Get the currently active time window based on current server time.
+
+    Cached like the active geofences, so a window boundary may be observed up
+    to geo_cache_ttl_seconds late.
+    """
+    return _cached_lookup("time_window", db, _ACTIVE_TIME_WINDOW_SQL)
 
 
 def geojson_to_postgis_polygon(geojson: dict) -> str:
@@ -135,9 +125,8 @@ def geojson_to_postgis_polygon(geojson: dict) -> str:
             "Polygon ring must have at least 4 coordinates (including closure)"
         )
 
-    # close ring if not closed
-    if ring[0] != ring[-1]:
-        ring = ring + [ring[0]]
+    # close ring if not closed (without copying the vertex list)
+    points = itertools.chain(ring, (ring[0],)) if ring[0] != ring[-1] else ring
 
-    wkt_coords = ", ".join(f"{lon} {lat}" for lon, lat in ring)
+    wkt_coords = ", ".join(f"{lon} {lat}" for lon, lat in points)
     return f"POLYGON(({wkt_coords}))"
@@ -1,15 +1,37 @@
 from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
 import asyncio
-import json
 
 router = APIRouter()
 
+HEARTBEAT_SECONDS = 5
+
+# encoded once; every client receives the same bytes
+_ALIVE_FRAME = b'data: {"alive": true}\n\n'
+
+# a single ticker wakes all connected clients instead of one timer each
+_tick = asyncio.Event()
+_ticker_task = None
+
+
+async def _ticker():
+    while True:
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        _tick.set()
+        _tick.clear()
+
+
+def _ensure_ticker():
+    global _ticker_task
+    if _ticker_task is None or _ticker_task.done():
+        _ticker_task = asyncio.create_task(_ticker())
+
 
 async def _stream():
+    _ensure_ticker()
     while True:
-        yield f"data: {json.dumps({'alive': True})}\n\n"
-        await asyncio.sleep(5)
+        yield _ALIVE_FRAME
+        await _tick.wait()
 
 
 @router.get("/stream/live")
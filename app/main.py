@@ -1,15 +1,19 @@
 """FastAPI application with attendance endpoints."""
 
-from fastapi import FastAPI, Depends, HTTPException, status, Query
+from fastapi import FastAPI, Depends, Header, HTTPException, status, Query
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from typing import List
-import json
+from typing import List, Optional
+import threading
+import orjson
+from cachetools import TTLCache
 
 # local modules (same folder as main.py inside the container)
 from metrics import router as metrics_router, PRESENCE_REQUESTS, PRESENCE_SUCCESSES
 from live import router as live_router
-from security_hmac import hmac_guard
+from security_hmac import HMACGuardMiddleware, log_hmac_backend
 
 from db import get_db
 from schemas import (
@@ -25,22 +29,39 @@ from schemas import (
 )
 from students.routes import router as students_router
 from events.routes import router as events_router
-from events.service import EventService
+from events.service import EventService, get_event_service
 from events.schemas import DailyStatsResponse
 from auth import authenticate_user, create_access_token, get_current_user
 from geo import (
-    check_point_in_geofence,
-    get_active_geofence_for_point,
+    clear_active_cache,
     get_active_time_window,
+    get_containing_geofence,
     geojson_to_postgis_polygon,
 )
 
+
+class LiveAwareGZipMiddleware(GZipMiddleware):
+    """GZip responses except the live stream, where compression buffers events."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/stream/live":
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
 app = FastAPI(
     title="Attendance Backend",
     description="API de gestion de présence avec géolocalisation",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
+# Signed mobile ingestion (HMAC over "<ts>.<body>") for /presence/check
+app.add_middleware(HMACGuardMiddleware)
+# Compress JSON pages and CSV exports above 1 KB
+app.add_middleware(LiveAwareGZipMiddleware, minimum_size=1000)
+
 # Observability & live stream
 app.include_router(metrics_router)  # exposes GET /metrics
 app.include_router(live_router)  # exposes GET /stream/live
@@ -50,6 +71,11 @@ app.include_router(students_router)
 app.include_router(events_router)
 
 
+@app.on_event("startup")
+def report_crypto_backend():
+    log_hmac_backend()
+
+
 # --------------------
 # Auth
 # --------------------
@@ -66,11 +92,64 @@ async def login(request: LoginRequest):
     return LoginResponse(access_token=access_token, token_type="bearer")
 
 
+# --------------------
+# Listing helpers
+# --------------------
+def _page_total(db: Session, rows, offset: int, count_sql) -> int:
+    """Total row count for a page selected with COUNT(*) OVER () AS total."""
+    if rows:
+        return rows[0].total
+    if not offset:
+        return 0
+    # past the last page: the window count is not available
+    return db.execute(count_sql).scalar_one()
+
+
 # --------------------
 # Geofences
 # --------------------
+_UPSERT_GEOFENCE_SQL = text(
+    """
+    INSERT INTO geofences (name, polygon, margin_m)
+    VALUES (:name, ST_GeogFromText(:polygon), :margin_m)
+    ON CONFLICT (name) DO UPDATE
+       SET polygon = EXCLUDED.polygon,
+           margin_m = EXCLUDED.margin_m,
+           updated_at = CURRENT_TIMESTAMP
+    RETURNING id, name, ST_AsGeoJSON(polygon) AS polygon,
+              margin_m, is_active, created_at, updated_at
+    """
+)
+
+_LIST_GEOFENCES_SQL = text(
+    """
+    SELECT id, name, ST_AsGeoJSON(polygon) AS polygon,
+           margin_m, is_active, created_at, updated_at,
+           COUNT(*) OVER () AS total
+      FROM geofences
+     ORDER BY created_at DESC, id DESC
+     LIMIT :limit OFFSET :offset
+    """
+)
+
+_COUNT_GEOFENCES_SQL = text("SELECT COUNT(*) FROM geofences")
+
+
+def _geofence_payload(row) -> dict:
+    """GeofenceResponse-shaped dict; the PostGIS GeoJSON text is embedded as is."""
+    return {
+        "id": row.id,
+        "name": row.name,
+        "polygon": orjson.Fragment(row.polygon),
+        "margin_m": row.margin_m,
+        "is_active": row.is_active,
+        "created_at": row.created_at.isoformat(),
+        "updated_at": row.updated_at.isoformat(),
+    }
+
+
 @app.post("/geofence", response_model=GeofenceResponse)
-async def upsert_geofence(
+def upsert_geofence(
     geofence: GeofenceCreate,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
@@ -78,68 +157,16 @@ async def upsert_geofence(
     """Upsert geofence (create or update)."""
     try:
         wkt_polygon = geojson_to_postgis_polygon(geofence.polygon)
-        existing = db.execute(
-            text("SELECT id FROM geofences WHERE name = :name"),
-            {"name": geofence.name},
-        ).fetchone()
-
-        if existing:
-            db.execute(
-                text(
-                    """
-                    UPDATE geofences 
-                       SET polygon = ST_GeogFromText(:polygon),
-                           margin_m = :margin_m,
-                           updated_at = CURRENT_TIMESTAMP
-                     WHERE name = :name
-                    """
-                ),
-                {
-                    "polygon": wkt_polygon,
-                    "margin_m": geofence.margin_m,
-                    "name": geofence.name,
-                },
-            )
-            geofence_id = existing.id
-        else:
-            result = db.execute(
-                text(
-                    """
-                    INSERT INTO geofences (name, polygon, margin_m)
-                    VALUES (:name, ST_GeogFromText(:polygon), :margin_m)
-                    RETURNING id
-                    """
-                ),
-                {
-                    "name": geofence.name,
-                    "polygon": wkt_polygon,
-                    "margin_m": geofence.margin_m,
-                },
-            )
-            geofence_id = result.fetchone().id
-
-        db.commit()
-
         row = db.execute(
-            text(
-                """
-                SELECT id, name, ST_AsGeoJSON(polygon) AS polygon, 
-                       margin_m, is_active, created_at, updated_at
-                  FROM geofences WHERE id = :id
-                """
-            ),
-            {"id": geofence_id},
+            _UPSERT_GEOFENCE_SQL,
+            {
+                "name": geofence.name,
+                "polygon": wkt_polygon,
+                "margin_m": geofence.margin_m,
+            },
         ).fetchone()
 
-        return GeofenceResponse(
-            id=row.id,
-            name=row.name,
-            polygon=json.loads(row.polygon),
-            margin_m=row.margin_m,
-            is_active=row.is_active,
-            created_at=row.created_at.isoformat(),
-            updated_at=row.updated_at.isoformat(),
-        )
+        db.commit()
 
     except Exception as e:
         db.rollback()
@@ -147,81 +174,102 @@ async def upsert_geofence(
             status_code=400, detail=f"Erreur lors de la sauvegarde: {str(e)}"
         )
 
+    # The geofence is saved; the next lookup rebuilds the in-process index
+    clear_active_cache()
+    return ORJSONResponse(_geofence_payload(row))
+
 
 @app.get("/geofence", response_model=List[GeofenceResponse])
-async def get_geofences(db: Session = Depends(get_db)):
-    """Get all geofences."""
+def get_geofences(
+    limit: int = Query(100, ge=1, le=1000, description="Nombre d'éléments par page"),
+    offset: int = Query(0, ge=0, description="Décalage pour la pagination"),
+    db: Session = Depends(get_db),
+):
+    """Get geofences, one page at a time (total in X-Total-Count)."""
     rows = db.execute(
-        text(
-            """
-            SELECT id, name, ST_AsGeoJSON(polygon) AS polygon,
-                   margin_m, is_active, created_at, updated_at
-              FROM geofences
-             ORDER BY created_at DESC
-            """
-        )
+        _LIST_GEOFENCES_SQL,
+        {"limit": limit, "offset": offset},
     ).fetchall()
 
-    return [
-        GeofenceResponse(
-            id=r.id,
-            name=r.name,
-            polygon=json.loads(r.polygon),
-            margin_m=r.margin_m,
-            is_active=r.is_active,
-            created_at=r.created_at.isoformat(),
-            updated_at=r.updated_at.isoformat(),
-        )
-        for r in rows
-    ]
+    total = _page_total(db, rows, offset, _COUNT_GEOFENCES_SQL)
+    return ORJSONResponse(
+        [_geofence_payload(r) for r in rows],
+        headers={"X-Total-Count": str(total)},
+    )
 
 
 # --------------------
 # Time windows
 # --------------------
+_DELETE_TIME_WINDOWS_SQL = text("DELETE FROM time_windows")
+
+# The whole list in one statement, as three parallel arrays
+_INSERT_TIME_WINDOWS_SQL = text(
+    """
+    WITH inserted AS (
+        INSERT INTO time_windows (name, start_time, end_time)
+        SELECT *
+          FROM unnest(
+                 CAST(:names AS varchar[]),
+                 CAST(:start_times AS time[]),
+                 CAST(:end_times AS time[])
+               )
+        RETURNING id, name, start_time, end_time,
+                  is_active, created_at, updated_at
+    )
+    SELECT * FROM inserted ORDER BY start_time
+    """
+)
+
+_LIST_TIME_WINDOWS_SQL = text(
+    """
+    SELECT id, name, start_time, end_time, is_active, created_at, updated_at,
+           COUNT(*) OVER () AS total
+      FROM time_windows
+     ORDER BY start_time, id
+     LIMIT :limit OFFSET :offset
+    """
+)
+
+_COUNT_TIME_WINDOWS_SQL = text("SELECT COUNT(*) FROM time_windows")
+
+
+def _time_window_payload(row) -> dict:
+    """TimeWindowResponse-shaped dict from a trusted DB row (no model round trip)."""
+    return {
+        "id": row.id,
+        "name": row.name,
+        "start_time": row.start_time.strftime("%H:%M:%S"),
+        "end_time": row.end_time.strftime("%H:%M:%S"),
+        "is_active": row.is_active,
+        "created_at": row.created_at.isoformat(),
+        "updated_at": row.updated_at.isoformat(),
+    }
+
+
 @app.post("/time-windows", response_model=List[TimeWindowResponse])
-async def replace_time_windows(
+def replace_time_windows(
     time_windows: List[TimeWindowCreate],
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
     """Replace all time windows (replace-all operation)."""
     try:
-        db.execute(text("DELETE FROM time_windows"))
-        for tw in time_windows:
-            db.execute(
-                text(
-                    """
-                    INSERT INTO time_windows (name, start_time, end_time)
-                    VALUES (:name, :start_time, :end_time)
-                    """
-                ),
-                {"name": tw.name, "start_time": tw.start_time, "end_time": tw.end_time},
-            )
+        db.execute(_DELETE_TIME_WINDOWS_SQL)
+        rows = []
+        if time_windows:
+            rows = db.execute(
+                _INSERT_TIME_WINDOWS_SQL,
+                {
+                    "names": [tw.name for tw in time_windows],
+                    "start_times": [tw.start_time for tw in time_windows],
+                    "end_times": [tw.end_time for tw in time_windows],
+                },
+            ).fetchall()
         db.commit()
+        clear_active_cache()
 
-        rows = db.execute(
-            text(
-                """
-                SELECT id, name, start_time, end_time, is_active, created_at, updated_at
-                  FROM time_windows
-                 ORDER BY start_time
-                """
-            )
-        ).fetchall()
-
-        return [
-            TimeWindowResponse(
-                id=r.id,
-                name=r.name,
-                start_time=r.start_time.strftime("%H:%M:%S"),
-                end_time=r.end_time.strftime("%H:%M:%S"),
-                is_active=r.is_active,
-                created_at=r.created_at.isoformat(),
-                updated_at=r.updated_at.isoformat(),
-            )
-            for r in rows
-        ]
+        return ORJSONResponse([_time_window_payload(r) for r in rows])
 
     except Exception as e:
         db.rollback()
@@ -231,139 +279,215 @@ async def replace_time_windows(
 
 
 @app.get("/time-windows", response_model=List[TimeWindowResponse])
-async def get_time_windows(db: Session = Depends(get_db)):
-    """Get all time windows."""
+def get_time_windows(
+    limit: int = Query(100, ge=1, le=1000, description="Nombre d'éléments par page"),
+    offset: int = Query(0, ge=0, description="Décalage pour la pagination"),
+    db: Session = Depends(get_db),
+):
+    """Get time windows, one page at a time (total in X-Total-Count)."""
     rows = db.execute(
-        text(
-            """
-            SELECT id, name, start_time, end_time, is_active, created_at, updated_at
-              FROM time_windows
-             ORDER BY start_time
-            """
-        )
+        _LIST_TIME_WINDOWS_SQL,
+        {"limit": limit, "offset": offset},
     ).fetchall()
 
-    return [
-        TimeWindowResponse(
-            id=r.id,
-            name=r.name,
-            start_time=r.start_time.strftime("%H:%M:%S"),
-            end_time=r.end_time.strftime("%H:%M:%S"),
-            is_active=r.is_active,
-            created_at=r.created_at.isoformat(),
-            updated_at=r.updated_at.isoformat(),
-        )
-        for r in rows
-    ]
+    total = _page_total(db, rows, offset, _COUNT_TIME_WINDOWS_SQL)
+    return ORJSONResponse(
+        [_time_window_payload(r) for r in rows],
+        headers={"X-Total-Count": str(total)},
+    )
 
 
 # --------------------
-# Presence check (HMAC-protected for mobile)
+# Presence check (HMAC-protected for mobile, see HMACGuardMiddleware)
 # --------------------
+# Student lookup, geofence pick, margin check, classification and both
+# audit inserts in one round trip. The g CTE is the only place that picks a
+# geofence for a point: containing geofences first, then the nearest by edge
+# distance, then the most recently updated.
+# :geofence_id prefers the geofence already found in process; when it is
+# NULL, or that geofence is no longer active (the in-process index can lag
+# by geo_cache_ttl_seconds), the database picks the containing/nearest one.
+# Columns come back NULL when the student or an active geofence is missing,
+# in which case nothing is inserted. A status without event_id means the
+# Idempotency-Key was already used for this student: nothing is inserted
+# and the earlier event is loaded instead.
+_PRESENCE_CHECK_SQL = text(
+    """
+    WITH s AS (
+        SELECT id FROM students WHERE matricule = :matricule
+    ),
+    pt AS (
+        SELECT ST_MakePoint(:lon, :lat)::geography AS geog
+    ),
+    g AS (
+        SELECT g.id, g.name,
+               ST_DWithin(g.polygon, pt.geog, COALESCE(g.margin_m, 0)) AS inside
+        FROM geofences g, pt
+        WHERE g.is_active = true
+        ORDER BY COALESCE(g.id = CAST(:geofence_id AS int), false) DESC,
+                 (NOT ST_DWithin(g.polygon, pt.geog, 0))::int ASC,
+                 ST_Distance(g.polygon, pt.geog) ASC,
+                 g.updated_at DESC
+        LIMIT 1
+    ),
+    d AS (
+        SELECT s.id AS student_id, g.id AS geofence_id, g.name AS geofence_name,
+               CASE
+                   WHEN g.inside THEN 'present'
+                   WHEN :method = 'manual' THEN 'late'
+                   ELSE 'outside'
+               END AS status
+        FROM s CROSS JOIN g
+    ),
+    ev AS (
+        INSERT INTO events (
+            student_id, status, latitude, longitude, geofence_id, method,
+            idempotency_key
+        )
+        SELECT student_id, status, :lat, :lon, geofence_id, :method,
+               :idempotency_key
+        FROM d
+        ON CONFLICT (student_id, idempotency_key)
+            WHERE idempotency_key IS NOT NULL DO NOTHING
+        RETURNING id, student_id, status, geofence_id
+    ),
+    att AS (
+        INSERT INTO attendances (student_id, event_id, time_window_id, status, geofence_id)
+        SELECT student_id, id, :time_window_id, status, geofence_id FROM ev
+    )
+    SELECT s.id AS student_id, d.geofence_name, d.status, ev.id AS event_id
+    FROM (SELECT 1) AS one
+    LEFT JOIN s ON true
+    LEFT JOIN d ON true
+    LEFT JOIN ev ON true
+    """
+)
+
+_STUDENT_EXISTS_SQL = text("SELECT id FROM students WHERE matricule = :m")
+
+# The event (and its attendance) recorded earlier under an Idempotency-Key
+_IDEMPOTENT_EVENT_SQL = text(
+    """
+    SELECT e.id AS event_id, e.status, g.name AS geofence_name,
+           tw.name AS time_window_name
+    FROM events e
+    JOIN students s ON s.id = e.student_id
+    LEFT JOIN geofences g ON g.id = e.geofence_id
+    LEFT JOIN attendances a ON a.event_id = e.id
+    LEFT JOIN time_windows tw ON tw.id = a.time_window_id
+    WHERE s.matricule = :matricule AND e.idempotency_key = :idempotency_key
+    """
+)
+
+# Same limit as events.idempotency_key
+_IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# bound once; prometheus counters are thread-safe and do not raise
+_inc_presence_requests = PRESENCE_REQUESTS.inc
+_inc_presence_successes = PRESENCE_SUCCESSES.inc
+
+# Recorded presence results by (Idempotency-Key, matricule): a fast path in
+# front of the events.idempotency_key unique index, which is what actually
+# keeps retries from creating a second event
+_IDEMPOTENT_RESULTS: TTLCache = TTLCache(maxsize=10_000, ttl=600)
+_IDEMPOTENT_RESULTS_LOCK = threading.Lock()
+
+_PRESENCE_MESSAGES = {
+    StatusEnum.present: "Présent dans la géofence",
+    StatusEnum.late: "En retard (vérification manuelle)",
+    StatusEnum.outside: "Absent (hors géofence)",
+}
+
+
 @app.post("/presence/check", response_model=PresenceCheckResponse)
-async def check_presence(
+def check_presence(
     request: PresenceCheckRequest,
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    _sec: bool = Depends(hmac_guard),
 ):
     """Check student presence based on location and time window."""
-    # increment counters on each request (not at import time)
-    try:
-        PRESENCE_REQUESTS.inc()
-    except Exception:
-        pass
+    _inc_presence_requests()
 
-    try:
-        # student
-        student = db.execute(
-            text("SELECT id FROM students WHERE matricule = :m"),
-            {"m": request.matricule},
-        ).fetchone()
-        if not student:
-            raise HTTPException(status_code=404, detail="Étudiant non trouvé")
-        student_id = student.id
+    if idempotency_key and len(idempotency_key) > _IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                "Idempotency-Key trop long "
+                f"({_IDEMPOTENCY_KEY_MAX_LENGTH} caractères max)"
+            ),
+        )
 
-        # time window (server time)
+    cache_key = (idempotency_key, request.matricule) if idempotency_key else None
+    if cache_key:
+        with _IDEMPOTENT_RESULTS_LOCK:
+            previous = _IDEMPOTENT_RESULTS.get(cache_key)
+        if previous is not None:
+            return previous
+
+    try:
+        # time window (server time, cached)
         time_window = get_active_time_window(db)
         if not time_window:
+            student = db.execute(
+                _STUDENT_EXISTS_SQL, {"m": request.matricule}
+            ).fetchone()
+            if not student:
+                raise HTTPException(status_code=404, detail="Étudiant non trouvé")
             return PresenceCheckResponse(
                 status=StatusEnum.absent, message="Aucune fenêtre horaire active"
             )
         time_window_id, time_window_name = time_window
 
-        # geofence (nearest/containing)
-        geofence = get_active_geofence_for_point(db, request.lat, request.lon)
-        if not geofence:
-            return PresenceCheckResponse(
-                status=StatusEnum.absent, message="Aucune géofence active"
-            )
-        geofence_id, geofence_name = geofence
-
-        # inside?
-        is_inside = check_point_in_geofence(db, request.lat, request.lon, geofence_id)
-
-        # classification
-        if is_inside:
-            status_val = StatusEnum.present
-            message = "Présent dans la géofence"
-        elif request.method == "manual":
-            status_val = StatusEnum.late
-            message = "En retard (vérification manuelle)"
-        else:
-            status_val = StatusEnum.outside
-            message = "Absent (hors géofence)"
-
-        # audit event (your current schema)
-        ev = db.execute(
-            text(
-                """
-                INSERT INTO events (student_id, status, latitude, longitude, geofence_id, method)
-                VALUES (:sid, :status, :lat, :lon, :gid, :method)
-                RETURNING id
-                """
-            ),
+        containing = get_containing_geofence(db, request.lat, request.lon)
+
+        row = db.execute(
+            _PRESENCE_CHECK_SQL,
             {
-                "sid": student_id,
-                "status": status_val.value,
+                "matricule": request.matricule,
                 "lat": request.lat,
                 "lon": request.lon,
-                "gid": geofence_id,
-                "method": request.method,
+                "method": request.method.value,
+                "time_window_id": time_window_id,
+                "geofence_id": containing[0] if containing else None,
+                "idempotency_key": idempotency_key,
             },
         ).fetchone()
-        event_id = ev.id
-
-        # (legacy) attendance record
-        db.execute(
-            text(
-                """
-                INSERT INTO attendances (student_id, event_id, time_window_id, status, geofence_id)
-                VALUES (:sid, :eid, :twid, :status, :gid)
-                """
-            ),
-            {
-                "sid": student_id,
-                "eid": event_id,
-                "twid": time_window_id,
-                "status": status_val.value,
-                "gid": geofence_id,
-            },
-        )
-
-        db.commit()
 
-        try:
-            PRESENCE_SUCCESSES.inc()
-        except Exception:
-            pass
+        if row.student_id is None:
+            db.rollback()
+            raise HTTPException(status_code=404, detail="Étudiant non trouvé")
+        if row.status is None:
+            db.rollback()
+            return PresenceCheckResponse(
+                status=StatusEnum.absent, message="Aucune géofence active"
+            )
+        if row.event_id is None:
+            # key already used (possibly by a request that just committed):
+            # answer with the recorded event
+            row = db.execute(
+                _IDEMPOTENT_EVENT_SQL,
+                {"matricule": request.matricule, "idempotency_key": idempotency_key},
+            ).fetchone()
+            db.rollback()
+            if row is None:  # recorded event deleted in the meantime
+                raise HTTPException(status_code=409, detail="Requête déjà traitée")
+            time_window_name = row.time_window_name
+        else:
+            db.commit()
+            _inc_presence_successes()
 
-        return PresenceCheckResponse(
+        status_val = StatusEnum(row.status)
+        result = PresenceCheckResponse(
             status=status_val,
-            message=message,
+            message=_PRESENCE_MESSAGES[status_val],
             time_window=time_window_name,
-            geofence=geofence_name,
-            event_id=event_id,
+            geofence=row.geofence_name,
+            event_id=row.event_id,
         )
+        if cache_key:
+            with _IDEMPOTENT_RESULTS_LOCK:
+                _IDEMPOTENT_RESULTS[cache_key] = result
+        return result
 
     except HTTPException:
         raise
@@ -378,9 +502,9 @@ async def check_presence(
 # Stats
 # --------------------
 @app.get("/stats/daily", response_model=DailyStatsResponse)
-async def get_daily_stats(
+def get_daily_stats(
     date: str = Query(..., description="Date pour les statistiques (YYYY-MM-DD)"),
-    db: Session = Depends(get_db),
+    service: EventService = Depends(get_event_service),
     current_user: dict = Depends(get_current_user),
 ):
     """Récupérer les statistiques quotidiennes pour une date donnée."""
@@ -392,7 +516,6 @@ async def get_daily_stats(
         raise HTTPException(
             status_code=400, detail="Format de date invalide. Utilisez YYYY-MM-DD"
         )
-    service = EventService(db)
     return service.get_daily_stats(target_date)
 
 
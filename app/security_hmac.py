@@ -1,41 +1,125 @@
 #!/usr/bin/env python3
-import hmac
 import hashlib
+import hmac
+import logging
+import ssl
 import time
-from fastapi import Header, HTTPException, Request
+from collections import deque
+from starlette.responses import JSONResponse
 from settings import settings  # your existing pydantic-settings
 
 MAX_SKEW = 120  # seconds
 
+# The signing secret is process-static: key the HMAC once and copy() it per
+# request instead of redoing the key setup. None when the secret is unset.
+# Naming the digest keeps hmac on OpenSSL's C implementation (SHA-NI where
+# the CPU has it).
+_SECRET = settings.signing_secret
+_API_KEY = settings.api_key_app
+_API_KEY_BYTES = _API_KEY.encode("utf-8") if _API_KEY else None
+_HMAC_PROTOTYPE = (
+    hmac.new(_SECRET.encode("utf-8"), digestmod="sha256") if _SECRET else None
+)
+
+
+# uvicorn configures this logger; ours would be silent by default
+logger = logging.getLogger("uvicorn.error")
+
 
-async def hmac_guard(
-    request: Request,
-    x_api_key: str = Header(None),
-    x_device_id: str = Header(None),
-    x_ts: str = Header(None),
-    x_signature: str = Header(None),
-):
-    if not all([x_api_key, x_device_id, x_ts, x_signature]):
-        raise HTTPException(status_code=401, detail="missing auth headers")
-    if x_api_key != getattr(settings, "API_KEY_APP", None):
-        raise HTTPException(status_code=401, detail="invalid api key")
+def log_hmac_backend() -> None:
+    """Log the OpenSSL build behind request signing and whether the CPU has SHA-NI."""
     try:
-        ts = int(x_ts)
-    except Exception:
-        raise HTTPException(status_code=401, detail="bad timestamp")
-    if abs(int(time.time()) - ts) > MAX_SKEW:
-        raise HTTPException(status_code=401, detail="stale request")
-
-    body = await request.body()
-    msg = str(ts).encode("utf-8") + b"." + body
-    secret = getattr(settings, "SIGNING_SECRET", None)
-    if not secret:
-        raise HTTPException(status_code=500, detail="server signing secret not set")
-    want = hmac.new(secret.encode("utf-8"), msg, hashlib.sha256).hexdigest()
-    if not hmac.compare_digest(want, x_signature):
-        raise HTTPException(status_code=401, detail="bad signature")
-
-    # expose for handler if useful
-    request.state.device_id = x_device_id
-    request.state.ts = ts
-    return True
+        with open("/proc/cpuinfo") as f:
+            sha_ni = any(
+                "sha_ni" in line.split() for line in f if line.startswith("flags")
+            )
+    except OSError:
+        sha_ni = None  # not Linux, unknown
+    logger.info(
+        "HMAC-SHA256 via %s (openssl sha256: %s, sha_ni: %s)",
+        ssl.OPENSSL_VERSION,
+        hashlib.sha256.__name__ == "openssl_sha256",
+        sha_ni,
+    )
+
+
+class HMACGuardMiddleware:
+    """
+    Pure ASGI guard for signed mobile requests.
+
+    Requests to the protected paths must send X-API-Key, X-Device-Id, X-Ts and
+    X-Signature = hex(HMAC-SHA256(secret, "<ts>.<body>")). Headers are read
+    straight from the scope; body chunks are hashed as they arrive and
+    replayed to the application unchanged. Rejections use the HTTPException
+    JSON shape.
+    """
+
+    def __init__(self, app, paths=("/presence/check",)):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        x_api_key = headers.get(b"x-api-key", b"")
+        x_device_id = headers.get(b"x-device-id", b"").decode("latin-1")
+        x_ts = headers.get(b"x-ts", b"").decode("latin-1")
+        x_signature = headers.get(b"x-signature", b"").decode("latin-1")
+
+        if not all([x_api_key, x_device_id, x_ts, x_signature]):
+            return await _reject(scope, receive, send, 401, "missing auth headers")
+        # constant-time, on raw bytes (compare_digest rejects non-ASCII str)
+        if not (_API_KEY_BYTES and hmac.compare_digest(x_api_key, _API_KEY_BYTES)):
+            return await _reject(scope, receive, send, 401, "invalid api key")
+        try:
+            ts = int(x_ts)
+        except ValueError:
+            return await _reject(scope, receive, send, 401, "bad timestamp")
+        if abs(time.time_ns() // 1_000_000_000 - ts) > MAX_SKEW:
+            return await _reject(scope, receive, send, 401, "stale request")
+        if _HMAC_PROTOTYPE is None:
+            return await _reject(
+                scope, receive, send, 500, "server signing secret not set"
+            )
+
+        # signed message is "<ts>.<body>": hash each body chunk as it arrives
+        # and keep the original messages to replay, never joining the body
+        mac = _HMAC_PROTOTYPE.copy()
+        mac.update(str(ts).encode("utf-8"))
+        mac.update(b".")
+        messages = deque()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            mac.update(message.get("body", b""))
+            messages.append(message)
+            if not message.get("more_body", False):
+                break
+
+        try:
+            got = bytes.fromhex(x_signature)
+        except ValueError:
+            return await _reject(scope, receive, send, 401, "bad signature")
+        if not hmac.compare_digest(mac.digest(), got):
+            return await _reject(scope, receive, send, 401, "bad signature")
+
+        # expose for handler (request.state.device_id / request.state.ts)
+        state = scope.setdefault("state", {})
+        state["device_id"] = x_device_id
+        state["ts"] = ts
+
+        async def replay():
+            if messages:
+                return messages.popleft()
+            return await receive()
+
+        await self.app(scope, replay, send)
+
+
+async def _reject(scope, receive, send, status_code: int, detail: str) -> None:
+    response = JSONResponse({"detail": detail}, status_code=status_code)
+    await response(scope, receive, send)
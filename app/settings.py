@@ -1,5 +1,6 @@
 """Application settings and configuration (Pydantic v2)."""
 
+from functools import lru_cache
 from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
@@ -36,6 +37,12 @@ class Settings(BaseSettings):
     # Optional attendance tuning
     attendance_grace_minutes: int = Field(default=0, env="ATTENDANCE_GRACE_MINUTES")
 
+    # Seconds to keep active geofence / time window lookups in memory
+    geo_cache_ttl_seconds: int = Field(default=10, env="GEO_CACHE_TTL_SECONDS")
+
+    # Largest CSV accepted by POST /students/import (after gunzip), in bytes
+    import_max_bytes: int = Field(default=2 * 1024 * 1024, env="IMPORT_MAX_BYTES")
+
     # Pydantic v2 settings
     model_config = SettingsConfigDict(
         env_file=".env",  # also reads OS env from Docker Compose
@@ -55,5 +62,11 @@ class Settings(BaseSettings):
         return self.signing_secret
 
 
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the process-wide settings, read from the environment once."""
+    return Settings()
+
+
 # Global settings instance
-settings = Settings()
+settings = get_settings()
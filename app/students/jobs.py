@@ -0,0 +1,92 @@
+"""Background jobs for student CSV imports."""
+
+import gzip
+import tempfile
+import threading
+import uuid
+import zlib
+from typing import BinaryIO, Optional, Tuple
+
+from cachetools import TTLCache
+from fastapi import HTTPException
+
+from db import SessionLocal
+from settings import settings
+from students.schemas import StudentImportJobResponse
+from students.service import StudentService
+
+# Job states are kept in this process (the API runs a single uvicorn worker);
+# entries expire an hour after their last update
+_JOBS: TTLCache = TTLCache(maxsize=1000, ttl=3600)
+_JOBS_LOCK = threading.Lock()
+
+# Uploads are copied into a job-owned spool: in memory up to 1 MiB, then on disk
+_SPOOL_MAX_BYTES = 1024 * 1024
+_CHUNK_BYTES = 64 * 1024
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _set_job(job_id: str, **fields) -> StudentImportJobResponse:
+    job = StudentImportJobResponse(job_id=job_id, **fields)
+    with _JOBS_LOCK:
+        _JOBS[job_id] = job
+    return job
+
+
+def _copy_capped(upload: BinaryIO, spool: BinaryIO) -> None:
+    """Copy the upload (gunzipped if compressed) into spool, up to the size cap."""
+    source = upload
+    if upload.read(len(_GZIP_MAGIC)) == _GZIP_MAGIC:
+        source = gzip.GzipFile(fileobj=upload, mode="rb")
+    upload.seek(0)
+
+    copied = 0
+    try:
+        while chunk := source.read(_CHUNK_BYTES):
+            copied += len(chunk)
+            if copied > settings.import_max_bytes:
+                raise HTTPException(
+                    status_code=413,
+                    detail=(
+                        "Le fichier dépasse la taille maximale "
+                        f"({settings.import_max_bytes} octets)"
+                    ),
+                )
+            spool.write(chunk)
+    except (gzip.BadGzipFile, zlib.error, EOFError):
+        raise HTTPException(status_code=400, detail="Fichier gzip invalide")
+
+
+def create_import_job(upload: BinaryIO) -> Tuple[StudentImportJobResponse, BinaryIO]:
+    """Register a pending import and copy the upload so it outlives the request."""
+    spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_BYTES)
+    try:
+        _copy_capped(upload, spool)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return _set_job(uuid.uuid4().hex, status="pending"), spool
+
+
+def run_import_job(job_id: str, spool: BinaryIO) -> None:
+    """Run one import with its own session and record the outcome."""
+    _set_job(job_id, status="running")
+    db = SessionLocal()
+    try:
+        result = StudentService(db).import_students_csv_stream(spool)
+    except HTTPException as e:
+        _set_job(job_id, status="failed", error=str(e.detail))
+    except Exception as e:
+        _set_job(job_id, status="failed", error=f"Erreur lors de l'import: {str(e)}")
+    else:
+        _set_job(job_id, status="done", result=result)
+    finally:
+        db.close()
+        spool.close()
+
+
+def get_import_job(job_id: str) -> Optional[StudentImportJobResponse]:
+    """Return the current state of an import job, or None if unknown/expired."""
+    with _JOBS_LOCK:
+        return _JOBS.get(job_id)
@@ -2,19 +2,31 @@
 
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Query,
+    UploadFile,
+    File,
+)
 from sqlalchemy.orm import Session
 
 from db import get_db
 from auth import get_current_user
-from students.service import StudentService  # absolute import avoids confusion
+from students.service import (  # absolute import avoids confusion
+    StudentService,
+    encode_cursor,
+)
+from students.jobs import create_import_job, get_import_job, run_import_job
 
 from students.schemas import (
     StudentCreate,
     StudentUpdate,
     StudentResponse,
     StudentListResponse,
-    StudentImportResponse,
+    StudentImportJobResponse,
 )
 
 
@@ -22,25 +34,41 @@ router = APIRouter(prefix="/students", tags=["students"])
 
 
 @router.get("", response_model=StudentListResponse)
-async def get_students(
+def get_students(
     q: Optional[str] = Query(
         None, description="Recherche par matricule, nom ou prénom"
     ),
     limit: int = Query(50, ge=1, le=100, description="Nombre d'éléments par page"),
     offset: int = Query(0, ge=0, description="Décalage pour la pagination"),
+    cursor: Optional[str] = Query(
+        None, description="Curseur de pagination (next_cursor de la page précédente)"
+    ),
+    include_total: bool = Query(
+        True, description="Calculer le nombre total d'étudiants"
+    ),
     db: Session = Depends(get_db),
 ):
     """Récupérer la liste des étudiants avec pagination et recherche."""
     service = StudentService(db)
-    students, total = service.get_students(q=q, limit=limit, offset=offset)
+    students, total = service.get_students(
+        q=q, limit=limit, offset=offset, cursor=cursor, include_total=include_total
+    )
+    next_cursor = None
+    if len(students) == limit:
+        last = students[-1]
+        next_cursor = encode_cursor(last["nom"], last["prenom"], last["id"])
 
     return StudentListResponse(
-        students=students, total=total, limit=limit, offset=offset
+        students=students,
+        total=total,
+        limit=limit,
+        offset=offset,
+        next_cursor=next_cursor,
     )
 
 
 @router.post("", response_model=StudentResponse, status_code=201)
-async def create_student(
+def create_student(
     student_data: StudentCreate,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
@@ -51,7 +79,7 @@ async def create_student(
 
 
 @router.get("/{student_id}", response_model=StudentResponse)
-async def get_student(
+def get_student(
     student_id: int,
     db: Session = Depends(get_db),
 ):
@@ -66,7 +94,7 @@ async def get_student(
 
 
 @router.put("/{student_id}", response_model=StudentResponse)
-async def update_student(
+def update_student(
     student_id: int,
     student_data: StudentUpdate,
     db: Session = Depends(get_db),
@@ -78,7 +106,7 @@ async def update_student(
 
 
 @router.delete("/{student_id}", status_code=204)
-async def delete_student(
+def delete_student(
     student_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
@@ -89,17 +117,32 @@ async def delete_student(
     return None
 
 
-@router.post("/import", response_model=StudentImportResponse)
-async def import_students(
+@router.post("/import", response_model=StudentImportJobResponse, status_code=202)
+def import_students(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(
         ..., description="Fichier CSV avec colonnes: matricule,nom,prenom"
     ),
-    db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
-    """Importer des étudiants depuis un fichier CSV."""
-    # Read file asynchronously here
-    content = await file.read()
-    # Pass bytes to the *sync* service method
-    service = StudentService(db)
-    return service.import_students_csv(content)
+    """Importer des étudiants depuis un fichier CSV (en arrière-plan)."""
+    if not str(file.filename or "").lower().endswith((".csv", ".csv.gz")):
+        raise HTTPException(status_code=400, detail="Le fichier doit être un CSV")
+
+    # the upload is closed with the request: the job gets its own copy,
+    # gunzipped when compressed and refused (413) past IMPORT_MAX_BYTES
+    job, spool = create_import_job(file.file)
+    background_tasks.add_task(run_import_job, job.job_id, spool)
+    return job
+
+
+@router.get("/import/{job_id}", response_model=StudentImportJobResponse)
+def get_import_status(
+    job_id: str,
+    current_user: dict = Depends(get_current_user),
+):
+    """Récupérer l'état d'un import CSV."""
+    job = get_import_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import non trouvé")
+    return job
@@ -1,6 +1,6 @@
 """Pydantic schemas for students."""
 
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import Optional, List
 from datetime import datetime
 
@@ -15,14 +15,16 @@ class StudentBase(BaseModel):
     prenom: str = Field(..., min_length=1, max_length=100, description="Prénom")
     is_active: bool = Field(default=True, description="Statut actif")
 
-    @validator("matricule")
+    @field_validator("matricule")
+    @classmethod
     def validate_matricule(cls, v):
         """Validate matricule format."""
         if not v or not v.strip():
             raise ValueError("Le matricule ne peut pas être vide")
         return v.strip().upper()
 
-    @validator("nom", "prenom")
+    @field_validator("nom", "prenom")
+    @classmethod
     def validate_names(cls, v):
         """Validate name format."""
         if not v or not v.strip():
@@ -47,7 +49,8 @@ class StudentUpdate(BaseModel):
     )
     is_active: Optional[bool] = Field(None, description="Statut actif")
 
-    @validator("nom", "prenom")
+    @field_validator("nom", "prenom")
+    @classmethod
     def validate_names(cls, v):
         """Validate name format."""
         if v is not None and (not v or not v.strip()):
@@ -62,17 +65,21 @@ class StudentResponse(StudentBase):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class StudentListResponse(BaseModel):
     """Schema for paginated student list response."""
 
     students: List[StudentResponse]
-    total: int
+    total: Optional[int] = Field(
+        ..., description="Nombre total d'étudiants (null si non demandé)"
+    )
     limit: int
     offset: int
+    next_cursor: Optional[str] = Field(
+        None, description="Curseur de la page suivante (pagination par clé)"
+    )
 
 
 class StudentImportRow(BaseModel):
@@ -82,19 +89,24 @@ class StudentImportRow(BaseModel):
     nom: str = Field(..., description="Nom")
     prenom: str = Field(..., description="Prénom")
 
-    @validator("matricule")
+    # trimming is done by pydantic-core before the validators run
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    @field_validator("matricule")
+    @classmethod
     def validate_matricule(cls, v):
         """Validate matricule format."""
-        if not v or not v.strip():
+        if not v:
             raise ValueError("Le matricule ne peut pas être vide")
-        return v.strip().upper()
+        return v.upper()
 
-    @validator("nom", "prenom")
+    @field_validator("nom", "prenom")
+    @classmethod
     def validate_names(cls, v):
         """Validate name format."""
-        if not v or not v.strip():
+        if not v:
             raise ValueError("Le nom et prénom ne peuvent pas être vides")
-        return v.strip().title()
+        return v.title()
 
 
 class StudentImportResponse(BaseModel):
@@ -104,3 +116,14 @@ class StudentImportResponse(BaseModel):
     error_count: int
     errors: List[str]
     message: str
+
+
+class StudentImportJobResponse(BaseModel):
+    """Schema for a background CSV import job."""
+
+    job_id: str
+    status: str = Field(..., description="pending, running, done ou failed")
+    result: Optional[StudentImportResponse] = Field(
+        None, description="Résumé de l'import une fois terminé"
+    )
+    error: Optional[str] = Field(None, description="Erreur si l'import a échoué")
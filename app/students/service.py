@@ -1,11 +1,26 @@
 """Business logic for students."""
 
+import base64
 import csv
 import io
-from typing import List, Tuple, Optional
+import json
+from functools import lru_cache
+from typing import (
+    BinaryIO,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    TextIO,
+    Tuple,
+)
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from fastapi import HTTPException, UploadFile
+from sqlalchemy.sql.elements import TextClause
+from fastapi import HTTPException
 
 from students.schemas import (
     StudentCreate,
@@ -14,6 +29,211 @@ from students.schemas import (
     StudentImportResponse,
 )
 
+_STUDENT_COLUMNS = "id, matricule, nom, prenom, is_active, created_at, updated_at"
+
+# same expression as idx_students_search_trgm
+_STUDENT_SEARCH = """
+    AND (lower(matricule) || ' ' || lower(nom) || ' ' || lower(prenom))
+        LIKE LOWER(:q)
+"""
+
+_LIST_STUDENTS_TEMPLATE = """
+    SELECT {columns}{total}
+    FROM students
+    WHERE is_active = true {search} {keyset}
+    ORDER BY nom, prenom, id
+    {pagination}
+"""
+
+# keyset position: rows strictly after the last one of the previous page,
+# an index range scan on idx_students_active_name_id
+_STUDENT_KEYSET = "AND (nom, prenom, id) > (:after_nom, :after_prenom, :after_id)"
+
+_COUNT_STUDENTS_TEMPLATE = """
+    SELECT COUNT(*) as total
+    FROM students
+    WHERE is_active = true {search}
+"""
+
+_COUNT_STUDENTS_SQL = text(_COUNT_STUDENTS_TEMPLATE.format(search=""))
+_COUNT_SEARCH_STUDENTS_SQL = text(
+    _COUNT_STUDENTS_TEMPLATE.format(search=_STUDENT_SEARCH)
+)
+
+
+@lru_cache(maxsize=None)
+def _list_students_sql(search: bool, keyset: bool, with_total: bool) -> TextClause:
+    """Build the listing statement for one combination of options, once."""
+    search_clause = _STUDENT_SEARCH if search else ""
+    # the total comes back with the rows: offset pages use a window function;
+    # keyset pages are narrowed by the cursor, so they count in a subquery
+    total = ""
+    if with_total and keyset:
+        count_sql = _COUNT_STUDENTS_TEMPLATE.format(search=search_clause)
+        total = f", ({count_sql}) as total"
+    elif with_total:
+        total = ", COUNT(*) OVER () as total"
+    return text(
+        _LIST_STUDENTS_TEMPLATE.format(
+            columns=_STUDENT_COLUMNS,
+            total=total,
+            search=search_clause,
+            keyset=_STUDENT_KEYSET if keyset else "",
+            pagination="LIMIT :limit" if keyset else "LIMIT :limit OFFSET :offset",
+        )
+    )
+
+
+_GET_STUDENT_BY_ID_SQL = text(f"SELECT {_STUDENT_COLUMNS} FROM students WHERE id = :id")
+
+_GET_STUDENT_BY_MATRICULE_SQL = text(
+    f"SELECT {_STUDENT_COLUMNS} FROM students WHERE matricule = :matricule"
+)
+
+# Insert-or-report-conflict in one statement: no row back means the
+# matricule is taken, without a racy existence check beforehand
+_INSERT_STUDENT_SQL = text(
+    f"""
+    INSERT INTO students (matricule, nom, prenom, is_active)
+    VALUES (:matricule, :nom, :prenom, :is_active)
+    ON CONFLICT (matricule) DO NOTHING
+    RETURNING {_STUDENT_COLUMNS}
+    """
+)
+
+# Fixed-shape partial update: NULL parameters keep the current value, so
+# every update reuses one statement. RETURNING hands back the updated row;
+# no row means unknown id.
+_UPDATE_STUDENT_SQL = text(
+    f"""
+    UPDATE students
+    SET nom = COALESCE(:nom, nom),
+        prenom = COALESCE(:prenom, prenom),
+        is_active = COALESCE(:is_active, is_active),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = :id
+    RETURNING {_STUDENT_COLUMNS}
+    """
+)
+
+# Whole import batch in one statement; rows whose matricule already exists
+# are skipped and left out of RETURNING
+_BULK_INSERT_STUDENTS_SQL = text(
+    """
+    INSERT INTO students (matricule, nom, prenom, is_active)
+    SELECT matricule, nom, prenom, true
+    FROM unnest(
+           CAST(:matricules AS varchar[]),
+           CAST(:noms AS varchar[]),
+           CAST(:prenoms AS varchar[])
+         ) AS t(matricule, nom, prenom)
+    ON CONFLICT (matricule) DO NOTHING
+    RETURNING matricule
+    """
+)
+
+# Above this many rows, stream the batch with COPY into a staging table
+_COPY_THRESHOLD = 1000
+
+_CREATE_IMPORT_STAGING_SQL = text(
+    """
+    CREATE TEMP TABLE students_import (
+        matricule VARCHAR(50),
+        nom VARCHAR(100),
+        prenom VARCHAR(100)
+    ) ON COMMIT DROP
+    """
+)
+
+_COPY_IMPORT_STAGING_SQL = (
+    "COPY students_import (matricule, nom, prenom) FROM STDIN WITH (FORMAT csv)"
+)
+
+_INSERT_FROM_STAGING_SQL = text(
+    """
+    INSERT INTO students (matricule, nom, prenom, is_active)
+    SELECT matricule, nom, prenom, true
+    FROM students_import
+    ON CONFLICT (matricule) DO NOTHING
+    RETURNING matricule
+    """
+)
+
+_REQUIRED_COLUMNS = ("matricule", "nom", "prenom")
+
+
+def _decode_stream(binary: BinaryIO) -> TextIO:
+    """Decode a binary CSV stream lazily (BOM-tolerant) instead of all at once."""
+    return io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+
+
+def _read_csv(stream: TextIO) -> Tuple[Set[str], Iterator[Tuple[str, str, str]]]:
+    """Return the missing required columns and a (matricule, nom, prenom) row iterator.
+
+    Column positions are resolved once from the header so rows stay plain lists
+    instead of one dict per line. Rows are read lazily from ``stream``.
+    """
+    reader = csv.reader(stream)
+    header = next(reader, [])
+    missing = set(_REQUIRED_COLUMNS).difference(header)
+    if missing:
+        return missing, iter(())
+
+    positions = [header.index(name) for name in _REQUIRED_COLUMNS]
+    width = max(positions) + 1
+
+    def rows() -> Iterator[Tuple[str, str, str]]:
+        m, n, p = positions
+        for row in reader:
+            if not row:  # blank line, skipped like DictReader did
+                continue
+            if len(row) < width:
+                row = row + [""] * (width - len(row))
+            yield row[m], row[n], row[p]
+
+    return missing, rows()
+
+
+def encode_cursor(nom: str, prenom: str, student_id: int) -> str:
+    """Encode a (nom, prenom, id) keyset position as an opaque cursor."""
+    # JSON rather than a separator: names may contain any character
+    raw = json.dumps([nom, prenom, student_id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str, int]:
+    """Decode a cursor produced by encode_cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        nom, prenom, student_id = json.loads(raw)
+        if not isinstance(nom, str) or not isinstance(prenom, str):
+            raise ValueError(cursor)
+        return nom, prenom, int(student_id)
+    except (ValueError, TypeError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+
+
+def _clean_import_row(matricule: str, nom: str, prenom: str) -> StudentImportRow:
+    """Normalise one CSV row the way StudentImportRow does, without validation.
+
+    Raises ValueError with the schema's messages; column widths follow the
+    students table.
+    """
+    matricule = matricule.strip()
+    nom = nom.strip()
+    prenom = prenom.strip()
+    if not matricule:
+        raise ValueError("Le matricule ne peut pas être vide")
+    if not nom or not prenom:
+        raise ValueError("Le nom et prénom ne peuvent pas être vides")
+    if len(matricule) > 50:
+        raise ValueError("Le matricule ne peut pas dépasser 50 caractères")
+    if len(nom) > 100 or len(prenom) > 100:
+        raise ValueError("Le nom et prénom ne peuvent pas dépasser 100 caractères")
+    return StudentImportRow.model_construct(
+        matricule=matricule.upper(), nom=nom.title(), prenom=prenom.title()
+    )
+
 
 class StudentService:
     """Service class for student operations."""
@@ -22,327 +242,244 @@ class StudentService:
         self.db = db
 
     def get_students(
-        self, q: Optional[str] = None, limit: int = 50, offset: int = 0
-    ) -> Tuple[List[dict], int]:
-        """Get students with pagination and search."""
-        search_condition = ""
-        params = {"limit": limit, "offset": offset}
+        self,
+        q: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+    ) -> Tuple[Sequence[Mapping], Optional[int]]:
+        """
+        Get students with pagination and search.
 
+        When a cursor is given, the page starts right after the cursor
+        position (keyset pagination) and offset is ignored. With
+        include_total=False the count is skipped and total is None.
+        """
+        params = {"limit": limit, "offset": offset}
         if q:
-            search_condition = """
-                AND (LOWER(matricule) LIKE LOWER(:q) 
-                     OR LOWER(nom) LIKE LOWER(:q) 
-                     OR LOWER(prenom) LIKE LOWER(:q))
-            """
             params["q"] = f"%{q}%"
-
-        count_query = f"""
-            SELECT COUNT(*) as total
-            FROM students 
-            WHERE is_active = true {search_condition}
-        """
-        total_result = self.db.execute(text(count_query), params).fetchone()
-        total = total_result.total if total_result else 0
-
-        students_query = f"""
-            SELECT id, matricule, nom, prenom, is_active, created_at, updated_at
-            FROM students 
-            WHERE is_active = true {search_condition}
-            ORDER BY nom, prenom
-            LIMIT :limit OFFSET :offset
-        """
-        students = self.db.execute(text(students_query), params).fetchall()
-
-        return [
-            {
-                "id": s.id,
-                "matricule": s.matricule,
-                "nom": s.nom,
-                "prenom": s.prenom,
-                "is_active": s.is_active,
-                "created_at": s.created_at,
-                "updated_at": s.updated_at,
-            }
-            for s in students
-        ], total
+        if cursor:
+            after = decode_cursor(cursor)
+            params["after_nom"], params["after_prenom"], params["after_id"] = after
+
+        list_sql = _list_students_sql(bool(q), bool(cursor), include_total)
+        students = self.db.execute(list_sql, params).mappings().all()
+
+        total = None
+        if include_total:
+            if students:
+                total = students[0]["total"]
+            elif offset or cursor:
+                # past the last page: no row to read the total from
+                count_sql = _COUNT_SEARCH_STUDENTS_SQL if q else _COUNT_STUDENTS_SQL
+                total = self.db.execute(count_sql, params).fetchone().total
+            else:
+                total = 0
+
+        # row mappings go straight to StudentResponse (extra "total" is ignored)
+        return students, total
 
     def get_student_by_id(self, student_id: int) -> Optional[dict]:
         """Get student by ID."""
         result = self.db.execute(
-            text(
-                """
-                SELECT id, matricule, nom, prenom, is_active, created_at, updated_at
-                FROM students 
-                WHERE id = :id
-                """
-            ),
-            {"id": student_id},
-        ).fetchone()
-
-        if not result:
-            return None
-
-        return {
-            "id": result.id,
-            "matricule": result.matricule,
-            "nom": result.nom,
-            "prenom": result.prenom,
-            "is_active": result.is_active,
-            "created_at": result.created_at,
-            "updated_at": result.updated_at,
-        }
+            _GET_STUDENT_BY_ID_SQL, {"id": student_id}
+        ).mappings().first()
+        return dict(result) if result else None
 
     def get_student_by_matricule(self, matricule: str) -> Optional[dict]:
         """Get student by matricule."""
         result = self.db.execute(
-            text(
-                """
-                SELECT id, matricule, nom, prenom, is_active, created_at, updated_at
-                FROM students 
-                WHERE matricule = :matricule
-                """
-            ),
-            {"matricule": matricule},
-        ).fetchone()
-
-        if not result:
-            return None
-
-        return {
-            "id": result.id,
-            "matricule": result.matricule,
-            "nom": result.nom,
-            "prenom": result.prenom,
-            "is_active": result.is_active,
-            "created_at": result.created_at,
-            "updated_at": result.updated_at,
-        }
+            _GET_STUDENT_BY_MATRICULE_SQL, {"matricule": matricule}
+        ).mappings().first()
+        return dict(result) if result else None
 
     def create_student(self, student_data: StudentCreate) -> dict:
         """Create a new student."""
-        existing = self.get_student_by_matricule(student_data.matricule)
-        if existing:
-            raise HTTPException(
-                status_code=409,
-                detail=f"Un étudiant avec le matricule '{student_data.matricule}' existe déjà",
-            )
-
         try:
-            result = self.db.execute(
-                text(
-                    """
-                    INSERT INTO students (matricule, nom, prenom, is_active)
-                    VALUES (:matricule, :nom, :prenom, :is_active)
-                    RETURNING id, created_at, updated_at
-                    """
-                ),
+            new_student = self.db.execute(
+                _INSERT_STUDENT_SQL,
                 {
                     "matricule": student_data.matricule,
                     "nom": student_data.nom,
                     "prenom": student_data.prenom,
                     "is_active": student_data.is_active,
                 },
-            )
-            new_student = result.fetchone()
+            ).mappings().first()
             self.db.commit()
-
-            return {
-                "id": new_student.id,
-                "matricule": student_data.matricule,
-                "nom": student_data.nom,
-                "prenom": student_data.prenom,
-                "is_active": student_data.is_active,
-                "created_at": new_student.created_at,
-                "updated_at": new_student.updated_at,
-            }
         except Exception as e:
             self.db.rollback()
             raise HTTPException(
                 status_code=400, detail=f"Erreur lors de la création: {str(e)}"
             )
 
+        if not new_student:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Un étudiant avec le matricule '{student_data.matricule}' existe déjà",
+            )
+        return dict(new_student)
+
     def update_student(self, student_id: int, student_data: StudentUpdate) -> dict:
         """Update a student."""
-        existing = self.get_student_by_id(student_id)
-        if not existing:
-            raise HTTPException(status_code=404, detail="Étudiant non trouvé")
-
-        update_fields = []
-        params = {"id": student_id}
-
-        if student_data.nom is not None:
-            update_fields.append("nom = :nom")
-            params["nom"] = student_data.nom
-        if student_data.prenom is not None:
-            update_fields.append("prenom = :prenom")
-            params["prenom"] = student_data.prenom
-        if student_data.is_active is not None:
-            update_fields.append("is_active = :is_active")
-            params["is_active"] = student_data.is_active
+        changes = {
+            "nom": student_data.nom,
+            "prenom": student_data.prenom,
+            "is_active": student_data.is_active,
+        }
 
-        if not update_fields:
+        if all(value is None for value in changes.values()):
+            existing = self.get_student_by_id(student_id)
+            if not existing:
+                raise HTTPException(status_code=404, detail="Étudiant non trouvé")
             return existing
 
-        update_fields.append("updated_at = CURRENT_TIMESTAMP")
-
         try:
-            self.db.execute(
-                text(
-                    f"""
-                    UPDATE students 
-                    SET {', '.join(update_fields)}
-                    WHERE id = :id
-                    """
-                ),
-                params,
-            )
+            updated = self.db.execute(
+                _UPDATE_STUDENT_SQL, {"id": student_id, **changes}
+            ).mappings().first()
             self.db.commit()
-            return self.get_student_by_id(student_id)
         except Exception as e:
             self.db.rollback()
             raise HTTPException(
                 status_code=400, detail=f"Erreur lors de la mise à jour: {str(e)}"
             )
 
-    def soft_delete_student(self, student_id: int) -> bool:
-        """Soft delete a student (set is_active=False)."""
-        existing = self.get_student_by_id(student_id)
-        if not existing:
+        if not updated:
             raise HTTPException(status_code=404, detail="Étudiant non trouvé")
+        return dict(updated)
 
+    def soft_delete_student(self, student_id: int) -> bool:
+        """Soft delete a student (set is_active=False)."""
         try:
-            self.db.execute(
+            deleted = self.db.execute(
                 text(
                     """
                     UPDATE students 
                     SET is_active = false, updated_at = CURRENT_TIMESTAMP
                     WHERE id = :id
+                    RETURNING id
                     """
                 ),
                 {"id": student_id},
-            )
+            ).first()
             self.db.commit()
-            return True
         except Exception as e:
             self.db.rollback()
             raise HTTPException(
                 status_code=400, detail=f"Erreur lors de la suppression: {str(e)}"
             )
 
+        if not deleted:
+            raise HTTPException(status_code=404, detail="Étudiant non trouvé")
+        return True
+
     # ---------- CSV import helpers ----------
 
-    def import_students_csv_content(self, content: bytes) -> StudentImportResponse:
-        """
-        Import students from raw CSV bytes (used by routes).
-        Validates required headers; returns a summary response object.
-        """
+    def bulk_create_students(self, rows: List[StudentImportRow]) -> Set[str]:
+        """Insert active students in one statement; returns the matricules created."""
+        if not rows:
+            return set()
         try:
-            csv_text = content.decode("utf-8-sig")
-            reader = csv.DictReader(io.StringIO(csv_text))
-
-            required = {"matricule", "nom", "prenom"}
-            headers = set(reader.fieldnames or [])
-            if not required.issubset(headers):
-                missing = required - headers
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Colonnes manquantes dans le CSV: {', '.join(missing)}",
+            if len(rows) > _COPY_THRESHOLD:
+                result = self._copy_students(rows)
+            else:
+                result = self.db.execute(
+                    _BULK_INSERT_STUDENTS_SQL,
+                    {
+                        "matricules": [r.matricule for r in rows],
+                        "noms": [r.nom for r in rows],
+                        "prenoms": [r.prenom for r in rows],
+                    },
                 )
-
-            success_count = 0
-            error_count = 0
-            errors: List[str] = []
-
-            for idx, row in enumerate(reader, start=2):
-                try:
-                    parsed = StudentImportRow(
-                        matricule=row.get("matricule", ""),
-                        nom=row.get("nom", ""),
-                        prenom=row.get("prenom", ""),
-                    )
-
-                    if self.get_student_by_matricule(parsed.matricule):
-                        error_count += 1
-                        errors.append(
-                            f"Ligne {idx}: Matricule '{parsed.matricule}' existe déjà"
-                        )
-                        continue
-
-                    data = StudentCreate(
-                        matricule=parsed.matricule,
-                        nom=parsed.nom,
-                        prenom=parsed.prenom,
-                        is_active=True,
-                    )
-                    self.create_student(data)
-                    success_count += 1
-                except Exception as e:
-                    error_count += 1
-                    errors.append(f"Ligne {idx}: {str(e)}")
-
-            return StudentImportResponse(
-                success_count=success_count,
-                error_count=error_count,
-                errors=errors,
-                message=f"Import terminé: {success_count} étudiants créés, {error_count} erreurs",
-            )
-        except HTTPException:
-            raise
+            created = {r.matricule for r in result}
+            self.db.commit()
+            return created
         except Exception as e:
+            self.db.rollback()
             raise HTTPException(
                 status_code=400, detail=f"Erreur lors de l'import: {str(e)}"
             )
 
-    async def import_students_csv(
-        self, upload_file: UploadFile
+    def _copy_students(self, rows: List[StudentImportRow]):
+        """COPY validated rows into a transaction-scoped staging table, then insert."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for r in rows:
+            writer.writerow((r.matricule, r.nom, r.prenom))
+        buffer.seek(0)
+
+        self.db.execute(_CREATE_IMPORT_STAGING_SQL)
+        # raw psycopg2 cursor on the session's connection (same transaction)
+        cursor = self.db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(_COPY_IMPORT_STAGING_SQL, buffer)
+        finally:
+            cursor.close()
+        return self.db.execute(_INSERT_FROM_STAGING_SQL)
+
+    def _import_rows(
+        self, rows: Iterable[Tuple[str, str, str]]
     ) -> StudentImportResponse:
-        """
-        Async CSV import used by tests.
-        - Must raise "Le fichier doit être un CSV" for bad extension
-        - Must raise "Colonnes manquantes" when headers are missing
-        - Returns StudentImportResponse with success/error counts
-        """
-        if not upload_file or not str(upload_file.filename).lower().endswith(".csv"):
-            raise Exception("Le fichier doit être un CSV")
-
-        raw = await upload_file.read()
-        text_csv = raw.decode("utf-8-sig")
-        reader = csv.DictReader(io.StringIO(text_csv))
-
-        required = {"matricule", "nom", "prenom"}
-        headers = set(reader.fieldnames or [])
-        if not required.issubset(headers):
-            raise Exception("Colonnes manquantes")
-
-        success_count = 0
-        error_count = 0
-        errors: List[str] = []
-
-        for idx, row in enumerate(reader, start=2):  # header is line 1
-            matricule = (row.get("matricule") or "").strip()
-            nom = (row.get("nom") or "").strip()
-            prenom = (row.get("prenom") or "").strip()
-
-            if not matricule:
-                error_count += 1
-                errors.append(f"Ligne {idx}: Matricule manquant")
+        """Validate CSV rows, insert them in bulk and summarise the outcome."""
+        errors: List[Tuple[int, str]] = []
+        valid: List[Tuple[int, StudentImportRow]] = []
+        seen: Set[str] = set()
+
+        # header is line 1
+        for idx, (matricule, nom, prenom) in enumerate(rows, start=2):
+            try:
+                parsed = _clean_import_row(matricule, nom, prenom)
+            except ValueError as e:
+                errors.append((idx, f"Ligne {idx}: {str(e)}"))
                 continue
-
-            if self.get_student_by_matricule(matricule):
-                error_count += 1
-                errors.append(f"Ligne {idx}: Matricule '{matricule}' existe déjà")
+            if parsed.matricule in seen:
+                errors.append(
+                    (idx, f"Ligne {idx}: Matricule '{parsed.matricule}' existe déjà")
+                )
                 continue
+            seen.add(parsed.matricule)
+            valid.append((idx, parsed))
+
+        created = self.bulk_create_students([parsed for _, parsed in valid])
+        for idx, parsed in valid:
+            if parsed.matricule not in created:
+                errors.append(
+                    (idx, f"Ligne {idx}: Matricule '{parsed.matricule}' existe déjà")
+                )
+        errors.sort(key=lambda e: e[0])
 
-            data = StudentCreate(
-                matricule=matricule, nom=nom, prenom=prenom, is_active=True
-            )
-            # tests monkeypatch this to avoid touching a real DB
-            self.create_student(data)
-            success_count += 1
-
+        success_count = len(created)
+        error_count = len(errors)
         return StudentImportResponse(
             success_count=success_count,
             error_count=error_count,
-            errors=errors,
+            errors=[message for _, message in errors],
             message=f"Import terminé: {success_count} étudiants créés, {error_count} erreurs",
         )
+
+    def import_students_csv_stream(self, binary: BinaryIO) -> StudentImportResponse:
+        """
+        Import students from a binary CSV stream (used by import jobs).
+        The stream is decoded and parsed line by line instead of being read
+        into memory first.
+        """
+        stream = _decode_stream(binary)
+        try:
+            missing, rows = _read_csv(stream)
+            if missing:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Colonnes manquantes dans le CSV: {', '.join(missing)}",
+                )
+
+            return self._import_rows(rows)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=400, detail=f"Erreur lors de l'import: {str(e)}"
+            )
+        finally:
+            # leave the caller's file open; it owns and closes it
+            stream.detach()
@@ -3,10 +3,11 @@
 import pytest
 import csv
 import io
-from unittest.mock import Mock, AsyncMock
-from fastapi import UploadFile
+from unittest.mock import Mock
+from fastapi import BackgroundTasks, HTTPException
 
 from students.schemas import StudentImportRow
+from .routes import import_students
 from .service import StudentService
 
 
@@ -83,16 +84,12 @@ class TestStudentImport:
         with pytest.raises(ValueError, match="Le matricule ne peut pas être vide"):
             StudentImportRow(**row_data)
 
-    @pytest.mark.asyncio
-    async def test_import_csv_valid_file(self):
+    def test_import_csv_valid_file(self):
         """Test importing a valid CSV file."""
-        # Create mock CSV content
-        csv_content = "matricule,nom,prenom\nSTU001,Dupont,Jean\nSTU002,Martin,Marie"
-
-        # Create mock file
-        mock_file = AsyncMock(spec=UploadFile)
-        mock_file.filename = "students.csv"
-        mock_file.read.return_value = csv_content.encode("utf-8")
+        # Create in-memory CSV upload
+        csv_file = io.BytesIO(
+            b"matricule,nom,prenom\nSTU001,Dupont,Jean\nSTU002,Martin,Marie"
+        )
 
         # Create mock database session
         mock_db = Mock()
@@ -100,41 +97,51 @@ class TestStudentImport:
         # Create service instance
         service = StudentService(mock_db)
 
-        # Mock the get_student_by_matricule method to return None (no existing students)
-        service.get_student_by_matricule = Mock(return_value=None)
-
-        # Mock the create_student method
-        service.create_student = Mock(
-            return_value={
-                "id": 1,
-                "matricule": "STU001",
-                "nom": "Dupont",
-                "prenom": "Jean",
-                "is_active": True,
-                "created_at": "2023-01-01T00:00:00",
-                "updated_at": "2023-01-01T00:00:00",
-            }
-        )
+        # Mock the bulk insert: every row is new
+        service.bulk_create_students = Mock(return_value={"STU001", "STU002"})
 
         # Test import
-        result = await service.import_students_csv(mock_file)
+        result = service.import_students_csv_stream(csv_file)
 
         # Assertions
+        service.bulk_create_students.assert_called_once()
+        rows = service.bulk_create_students.call_args[0][0]
+        assert [r.matricule for r in rows] == ["STU001", "STU002"]
         assert result.success_count == 2
         assert result.error_count == 0
         assert len(result.errors) == 0
         assert "2 étudiants créés" in result.message
 
-    @pytest.mark.asyncio
-    async def test_import_csv_missing_columns(self):
-        """Test importing CSV with missing columns."""
-        # Create mock CSV content with missing columns
-        csv_content = "matricule,nom\nSTU001,Dupont"
+    def test_import_csv_with_bom(self):
+        """Test that a UTF-8 BOM does not end up in the first header."""
+        csv_file = io.BytesIO(
+            "\ufeffmatricule,nom,prenom\nSTU001,Dupont,Jean".encode("utf-8")
+        )
+
+        service = StudentService(Mock())
+        service.bulk_create_students = Mock(return_value={"STU001"})
 
-        # Create mock file
-        mock_file = AsyncMock(spec=UploadFile)
-        mock_file.filename = "students.csv"
-        mock_file.read.return_value = csv_content.encode("utf-8")
+        result = service.import_students_csv_stream(csv_file)
+
+        rows = service.bulk_create_students.call_args[0][0]
+        assert [r.matricule for r in rows] == ["STU001"]
+        assert result.success_count == 1
+
+    def test_import_csv_leaves_caller_file_open(self):
+        """Test that the caller keeps ownership of the file it passed in."""
+        csv_file = io.BytesIO(b"matricule,nom,prenom\nSTU001,Dupont,Jean")
+
+        service = StudentService(Mock())
+        service.bulk_create_students = Mock(return_value={"STU001"})
+
+        service.import_students_csv_stream(csv_file)
+
+        assert not csv_file.closed
+
+    def test_import_csv_missing_columns(self):
+        """Test importing CSV with missing columns."""
+        # Create CSV upload with missing columns
+        csv_file = io.BytesIO(b"matricule,nom\nSTU001,Dupont")
 
         # Create mock database session
         mock_db = Mock()
@@ -143,19 +150,18 @@ class TestStudentImport:
         service = StudentService(mock_db)
 
         # Test import should raise HTTPException
-        with pytest.raises(Exception, match="Colonnes manquantes"):
-            await service.import_students_csv(mock_file)
+        with pytest.raises(HTTPException) as exc_info:
+            service.import_students_csv_stream(csv_file)
+        assert exc_info.value.status_code == 400
+        assert "Colonnes manquantes" in exc_info.value.detail
+        assert not csv_file.closed
 
-    @pytest.mark.asyncio
-    async def test_import_csv_duplicate_matricule(self):
+    def test_import_csv_duplicate_matricule(self):
         """Test importing CSV with duplicate matricule."""
-        # Create mock CSV content
-        csv_content = "matricule,nom,prenom\nSTU001,Dupont,Jean\nSTU001,Martin,Marie"
-
-        # Create mock file
-        mock_file = AsyncMock(spec=UploadFile)
-        mock_file.filename = "students.csv"
-        mock_file.read.return_value = csv_content.encode("utf-8")
+        # Create CSV upload
+        csv_file = io.BytesIO(
+            b"matricule,nom,prenom\nSTU001,Dupont,Jean\nSTU001,Martin,Marie"
+        )
 
         # Create mock database session
         mock_db = Mock()
@@ -163,22 +169,11 @@ class TestStudentImport:
         # Create service instance
         service = StudentService(mock_db)
 
-        # Mock the get_student_by_matricule method
-        def mock_get_student(matricule):
-            if matricule == "STU001":
-                return {
-                    "id": 1,
-                    "matricule": "STU001",
-                    "nom": "Dupont",
-                    "prenom": "Jean",
-                }
-            return None
-
-        service.get_student_by_matricule = Mock(side_effect=mock_get_student)
-        service.create_student = Mock()
+        # Mock the bulk insert: STU001 already exists, nothing is created
+        service.bulk_create_students = Mock(return_value=set())
 
         # Test import
-        result = await service.import_students_csv(mock_file)
+        result = service.import_students_csv_stream(csv_file)
 
         # Assertions
         assert result.success_count == 0
@@ -187,22 +182,34 @@ class TestStudentImport:
         assert "existe déjà" in result.errors[0]
         assert "existe déjà" in result.errors[1]
 
-    @pytest.mark.asyncio
-    async def test_import_csv_invalid_file_extension(self):
-        """Test importing file with invalid extension."""
-        # Create mock file
-        mock_file = AsyncMock(spec=UploadFile)
-        mock_file.filename = "students.txt"
+    def test_import_csv_invalid_row(self):
+        """Test that an invalid row is reported and normalised rows are inserted."""
+        csv_file = io.BytesIO(
+            b"matricule,nom,prenom\n stu001 ,dupont,jean\nSTU002,,Marie"
+        )
 
-        # Create mock database session
-        mock_db = Mock()
+        service = StudentService(Mock())
+        service.bulk_create_students = Mock(return_value={"STU001"})
 
-        # Create service instance
-        service = StudentService(mock_db)
+        result = service.import_students_csv_stream(csv_file)
 
-        # Test import should raise HTTPException
-        with pytest.raises(Exception, match="Le fichier doit être un CSV"):
-            await service.import_students_csv(mock_file)
+        rows = service.bulk_create_students.call_args[0][0]
+        assert [(r.matricule, r.nom, r.prenom) for r in rows] == [
+            ("STU001", "Dupont", "Jean")
+        ]
+        assert result.success_count == 1
+        assert result.errors == [
+            "Ligne 3: Le nom et prénom ne peuvent pas être vides"
+        ]
+
+    def test_import_csv_invalid_file_extension(self):
+        """Test that the import route rejects a non-CSV upload."""
+        upload = Mock(filename="students.txt", file=io.BytesIO(b""))
+
+        with pytest.raises(HTTPException) as exc_info:
+            import_students(BackgroundTasks(), file=upload, current_user={})
+        assert exc_info.value.status_code == 400
+        assert exc_info.value.detail == "Le fichier doit être un CSV"
 
     def test_csv_parser_basic(self):
         """Test basic CSV parsing functionality."""
@@ -0,0 +1,145 @@
+"""Unit tests for background student imports."""
+
+import gzip
+import io
+from unittest.mock import Mock
+
+import pytest
+from fastapi import BackgroundTasks, HTTPException
+
+from students import jobs
+from students.routes import get_import_status, import_students
+from students.service import StudentService
+
+CSV = b"matricule,nom,prenom\nSTU001,Dupont,Jean\n"
+
+
+@pytest.fixture
+def small_cap(monkeypatch):
+    """Limit imports to 100 bytes."""
+    monkeypatch.setattr(jobs.settings, "import_max_bytes", 100)
+
+
+class TestCopyCapped:
+    """Test cases for the upload size cap and gzip handling."""
+
+    def test_plain_csv_under_cap(self, small_cap):
+        """Test that a small CSV is copied unchanged."""
+        spool = io.BytesIO()
+        jobs._copy_capped(io.BytesIO(CSV), spool)
+
+        assert spool.getvalue() == CSV
+
+    def test_plain_csv_over_cap(self, small_cap):
+        """Test that a CSV larger than the cap is rejected with a 413."""
+        with pytest.raises(HTTPException) as exc_info:
+            jobs._copy_capped(io.BytesIO(CSV * 3), io.BytesIO())
+        assert exc_info.value.status_code == 413
+
+    def test_gzip_is_decompressed(self, small_cap):
+        """Test that a gzipped upload is stored decompressed."""
+        spool = io.BytesIO()
+        jobs._copy_capped(io.BytesIO(gzip.compress(CSV)), spool)
+
+        assert spool.getvalue() == CSV
+
+    def test_gzip_expanding_past_cap(self, small_cap):
+        """Test that the cap applies to the decompressed size."""
+        compressed = gzip.compress(CSV * 100)
+        assert len(compressed) < 100
+
+        with pytest.raises(HTTPException) as exc_info:
+            jobs._copy_capped(io.BytesIO(compressed), io.BytesIO())
+        assert exc_info.value.status_code == 413
+
+    def test_truncated_gzip(self):
+        """Test that a truncated gzip upload is rejected with a 400."""
+        truncated = gzip.compress(CSV * 10)[:-12]
+
+        with pytest.raises(HTTPException) as exc_info:
+            jobs._copy_capped(io.BytesIO(truncated), io.BytesIO())
+        assert exc_info.value.status_code == 400
+        assert exc_info.value.detail == "Fichier gzip invalide"
+
+
+@pytest.fixture
+def session(monkeypatch):
+    """Stub SessionLocal so jobs never open a real connection."""
+    db = Mock()
+    monkeypatch.setattr(jobs, "SessionLocal", Mock(return_value=db))
+    return db
+
+
+class TestImportJobs:
+    """Test cases for the background import job lifecycle."""
+
+    def test_job_runs_from_pending_to_done(self, session, monkeypatch):
+        """Test that a job goes pending -> running -> done with its summary."""
+        job, spool = jobs.create_import_job(io.BytesIO(CSV))
+        assert job.status == "pending"
+        assert jobs.get_import_job(job.job_id) == job
+
+        seen = []
+
+        def bulk_create(service, rows):
+            seen.append(jobs.get_import_job(job.job_id).status)
+            return {r.matricule for r in rows}
+
+        monkeypatch.setattr(StudentService, "bulk_create_students", bulk_create)
+
+        jobs.run_import_job(job.job_id, spool)
+
+        done = jobs.get_import_job(job.job_id)
+        assert seen == ["running"]
+        assert done.status == "done"
+        assert done.result.success_count == 1
+        assert done.error is None
+        session.close.assert_called_once()
+        assert spool.closed
+
+    def test_failed_job_keeps_http_detail(self, session):
+        """Test that an HTTPException from the import is kept as the job error."""
+        job, spool = jobs.create_import_job(io.BytesIO(b"matricule,nom\nSTU001,Dupont"))
+
+        jobs.run_import_job(job.job_id, spool)
+
+        failed = jobs.get_import_job(job.job_id)
+        assert failed.status == "failed"
+        assert failed.error.startswith("Colonnes manquantes dans le CSV")
+        assert failed.result is None
+        session.close.assert_called_once()
+
+    def test_failed_job_on_unexpected_error(self, session, monkeypatch):
+        """Test that any other error fails the job with a generic message."""
+        job, spool = jobs.create_import_job(io.BytesIO(CSV))
+
+        def boom(service, binary):
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr(StudentService, "import_students_csv_stream", boom)
+
+        jobs.run_import_job(job.job_id, spool)
+
+        failed = jobs.get_import_job(job.job_id)
+        assert failed.status == "failed"
+        assert failed.error == "Erreur lors de l'import: boom"
+
+    def test_import_route_accepts_and_schedules(self):
+        """Test that the import route answers with a pending job and queues it."""
+        background_tasks = BackgroundTasks()
+        upload = Mock(filename="students.csv", file=io.BytesIO(CSV))
+
+        job = import_students(background_tasks, file=upload, current_user={})
+
+        assert job.status == "pending"
+        assert len(background_tasks.tasks) == 1
+        job_id, spool = background_tasks.tasks[0].args
+        assert job_id == job.job_id
+        assert spool.read() == CSV
+        spool.close()
+
+    def test_unknown_job_is_404(self):
+        """Test that polling an unknown job id returns a 404."""
+        with pytest.raises(HTTPException) as exc_info:
+            get_import_status("unknown", current_user={})
+        assert exc_info.value.status_code == 404
@@ -0,0 +1,22 @@
+"""Unit tests for student listing."""
+
+import pytest
+from fastapi import HTTPException
+
+from .service import encode_cursor, decode_cursor
+
+
+class TestStudentCursor:
+    """Test cases for keyset pagination cursors."""
+
+    def test_cursor_round_trip(self):
+        """Test that a cursor decodes to the position it was built from."""
+        cursor = encode_cursor("Dupont|Martin", "Jean", 42)
+
+        assert decode_cursor(cursor) == ("Dupont|Martin", "Jean", 42)
+
+    def test_decode_invalid_cursor(self):
+        """Test that a malformed cursor is rejected with a 400."""
+        with pytest.raises(HTTPException) as exc_info:
+            decode_cursor("not-a-cursor")
+        assert exc_info.value.status_code == 400
@@ -2,7 +2,12 @@
 
 from datetime import timedelta
 
-from auth import authenticate_user, create_access_token, verify_token
+from auth import (
+    authenticate_user,
+    clear_token_cache,
+    create_access_token,
+    verify_token,
+)
 from settings import settings
 
 
@@ -67,3 +72,13 @@ class TestAuthentication:
 
         payload = verify_token(token)
         assert payload is None
+
+    def test_verify_token_cached(self):
+        """Test repeated verification returns the cached payload."""
+        clear_token_cache()
+        token = create_access_token({"sub": "test_user"})
+
+        first = verify_token(token)
+        second = verify_token(token)
+        assert second is first
+        assert second["sub"] == "test_user"
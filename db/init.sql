@@ -1,10 +1,13 @@
 -- Enable PostGIS extension
 CREATE EXTENSION IF NOT EXISTS postgis;
 
+-- Trigram indexes for substring search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- Students table
 CREATE TABLE students (
     id SERIAL PRIMARY KEY,
-    matricule VARCHAR(50) UNIQUE NOT NULL,
+    matricule VARCHAR(50) NOT NULL,
     nom VARCHAR(100) NOT NULL,
     prenom VARCHAR(100) NOT NULL,
     is_active BOOLEAN DEFAULT true NOT NULL,
@@ -12,6 +15,19 @@ CREATE TABLE students (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Unique matricule; covering id makes the presence-check lookup index-only
+CREATE UNIQUE INDEX idx_students_matricule ON students (matricule) INCLUDE (id);
+
+-- Active students listed by name, id as keyset tiebreaker
+-- (index-only range scan for GET /students)
+CREATE INDEX idx_students_active_name_id ON students (nom, prenom, id)
+    INCLUDE (matricule, is_active, created_at, updated_at)
+    WHERE is_active = true;
+
+-- Substring search over matricule, nom and prenom (LIKE '%q%')
+CREATE INDEX idx_students_search_trgm ON students
+    USING gin ((lower(matricule) || ' ' || lower(nom) || ' ' || lower(prenom)) gin_trgm_ops);
+
 -- Geofences table with PostGIS geography column
 CREATE TABLE geofences (
     id SERIAL PRIMARY KEY,
@@ -23,9 +39,15 @@ CREATE TABLE geofences (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Geofences are upserted by name
+CREATE UNIQUE INDEX idx_geofences_name ON geofences (name);
+
 -- Create GIST spatial index on geofences polygon
 CREATE INDEX idx_geofences_polygon ON geofences USING GIST (polygon);
 
+-- SP-GiST index for point-in-polygon prefiltering (ST_DWithin)
+CREATE INDEX idx_geofences_polygon_spgist ON geofences USING SPGIST (polygon);
+
 -- Time windows table
 CREATE TABLE time_windows (
     id SERIAL PRIMARY KEY,
@@ -37,6 +59,10 @@ CREATE TABLE time_windows (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Active window lookup by current time
+CREATE INDEX idx_time_windows_active ON time_windows (start_time, end_time)
+    WHERE is_active;
+
 -- Events table (presence check results)
 CREATE TABLE events (
     id SERIAL PRIMARY KEY,
@@ -46,11 +72,78 @@ CREATE TABLE events (
     longitude DECIMAL(11, 8) NOT NULL,
     geofence_id INTEGER REFERENCES geofences(id) ON DELETE SET NULL,
     method VARCHAR(20) NOT NULL CHECK (method IN ('manual', 'auto')),
+    idempotency_key VARCHAR(255),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Create index on (student_id, created_at) for efficient queries
-CREATE INDEX idx_events_student_created ON events (student_id, created_at);
+-- Client Idempotency-Key of a presence check, unique per student
+CREATE UNIQUE INDEX idx_events_idempotency_key ON events (student_id, idempotency_key)
+    WHERE idempotency_key IS NOT NULL;
+
+-- Covering index for per-student listing, newest first (index-only scan)
+CREATE INDEX idx_events_student_created_desc ON events (student_id, created_at DESC, id DESC)
+    INCLUDE (status, latitude, longitude, geofence_id, method);
+
+-- Index for date-range filters and newest-first (keyset) listing
+CREATE INDEX idx_events_created_at_id ON events (created_at DESC, id DESC);
+
+-- Daily statistics rollup, maintained by trigger on events
+CREATE TABLE events_daily_stats (
+    day DATE PRIMARY KEY,
+    total_events INTEGER NOT NULL DEFAULT 0,
+    present_count INTEGER NOT NULL DEFAULT 0,
+    late_count INTEGER NOT NULL DEFAULT 0,
+    absent_count INTEGER NOT NULL DEFAULT 0,
+    outside_count INTEGER NOT NULL DEFAULT 0,
+    manual_count INTEGER NOT NULL DEFAULT 0,
+    auto_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- Add (delta = 1) or remove (delta = -1) one event from the rollup of its day
+CREATE FUNCTION events_daily_stats_apply(
+    p_day DATE, p_status VARCHAR, p_method VARCHAR, p_delta INTEGER
+) RETURNS VOID AS $$
+BEGIN
+    INSERT INTO events_daily_stats AS d (
+        day, total_events, present_count, late_count, absent_count,
+        outside_count, manual_count, auto_count
+    )
+    VALUES (
+        p_day,
+        p_delta,
+        CASE WHEN p_status = 'present' THEN p_delta ELSE 0 END,
+        CASE WHEN p_status = 'late' THEN p_delta ELSE 0 END,
+        CASE WHEN p_status = 'absent' THEN p_delta ELSE 0 END,
+        CASE WHEN p_status = 'outside' THEN p_delta ELSE 0 END,
+        CASE WHEN p_method = 'manual' THEN p_delta ELSE 0 END,
+        CASE WHEN p_method = 'auto' THEN p_delta ELSE 0 END
+    )
+    ON CONFLICT (day) DO UPDATE SET
+        total_events = d.total_events + EXCLUDED.total_events,
+        present_count = d.present_count + EXCLUDED.present_count,
+        late_count = d.late_count + EXCLUDED.late_count,
+        absent_count = d.absent_count + EXCLUDED.absent_count,
+        outside_count = d.outside_count + EXCLUDED.outside_count,
+        manual_count = d.manual_count + EXCLUDED.manual_count,
+        auto_count = d.auto_count + EXCLUDED.auto_count;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION events_stats_trg_fn() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM events_daily_stats_apply(OLD.created_at::date, OLD.status, OLD.method, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM events_daily_stats_apply(NEW.created_at::date, NEW.status, NEW.method, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER events_stats_trg
+AFTER INSERT OR UPDATE OR DELETE ON events
+FOR EACH ROW EXECUTE FUNCTION events_stats_trg_fn();
 
 -- Attendances table (decisions - processed attendance records)
 CREATE TABLE attendances (
@@ -0,0 +1,84 @@
+-- Daily statistics rollup for GET /stats/daily.
+-- Replaces the per-request aggregate over events with a one-row lookup.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS events_daily_stats (
+    day DATE PRIMARY KEY,
+    total_events INTEGER NOT NULL DEFAULT 0,
+    present_count INTEGER NOT NULL DEFAULT 0,
+    late_count INTEGER NOT NULL DEFAULT 0,
+    absent_count INTEGER NOT NULL DEFAULT 0,
+    outside_count INTEGER NOT NULL DEFAULT 0,
+    manual_count INTEGER NOT NULL DEFAULT 0,
+    auto_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION events_daily_stats_apply(
+    p_day DATE, p_status VARCHAR, p_method VARCHAR, p_delta INTEGER
+) RETURNS VOID AS $$
+BEGIN
+    INSERT INTO events_daily_stats AS d (
+        day, total_events, present_count, late_count, absent_count,
+        outside_count, manual_count, auto_count
+    )
+    VALUES (
+        p_day,
+        p_delta,
+        CASE WHEN p_status = 'present' THEN p_delta ELSE 0 END,
+        CASE WHEN p_status = 'late' THEN p_delta ELSE 0 END,
+        CASE WHEN p_status = 'absent' THEN p_delta ELSE 0 END,
+        CASE WHEN p_status = 'outside' THEN p_delta ELSE 0 END,
+        CASE WHEN p_method = 'manual' THEN p_delta ELSE 0 END,
+        CASE WHEN p_method = 'auto' THEN p_delta ELSE 0 END
+    )
+    ON CONFLICT (day) DO UPDATE SET
+        total_events = d.total_events + EXCLUDED.total_events,
+        present_count = d.present_count + EXCLUDED.present_count,
+        late_count = d.late_count + EXCLUDED.late_count,
+        absent_count = d.absent_count + EXCLUDED.absent_count,
+        outside_count = d.outside_count + EXCLUDED.outside_count,
+        manual_count = d.manual_count + EXCLUDED.manual_count,
+        auto_count = d.auto_count + EXCLUDED.auto_count;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION events_stats_trg_fn() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM events_daily_stats_apply(OLD.created_at::date, OLD.status, OLD.method, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM events_daily_stats_apply(NEW.created_at::date, NEW.status, NEW.method, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Lock events so no row slips between the backfill and the trigger
+LOCK TABLE events IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS events_stats_trg ON events;
+CREATE TRIGGER events_stats_trg
+AFTER INSERT OR UPDATE OR DELETE ON events
+FOR EACH ROW EXECUTE FUNCTION events_stats_trg_fn();
+
+-- One-off backfill from existing events
+TRUNCATE events_daily_stats;
+INSERT INTO events_daily_stats (
+    day, total_events, present_count, late_count, absent_count,
+    outside_count, manual_count, auto_count
+)
+SELECT
+    created_at::date,
+    COUNT(*),
+    COUNT(*) FILTER (WHERE status = 'present'),
+    COUNT(*) FILTER (WHERE status = 'late'),
+    COUNT(*) FILTER (WHERE status = 'absent'),
+    COUNT(*) FILTER (WHERE status = 'outside'),
+    COUNT(*) FILTER (WHERE method = 'manual'),
+    COUNT(*) FILTER (WHERE method = 'auto')
+FROM events
+GROUP BY created_at::date;
+
+COMMIT;
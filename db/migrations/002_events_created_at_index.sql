@@ -0,0 +1,4 @@
+-- Range scans on events.created_at (GET /events from/to filters and
+-- ORDER BY created_at DESC) had no usable index.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_created_at ON events (created_at);
@@ -0,0 +1,8 @@
+-- Keyset pagination on GET /events orders by (created_at DESC, id DESC).
+-- The composite index also serves created_at range filters, so it
+-- replaces idx_events_created_at.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_created_at_id
+    ON events (created_at DESC, id DESC);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_events_created_at;
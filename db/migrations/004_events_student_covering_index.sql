@@ -0,0 +1,10 @@
+-- GET /events?matricule=... filters on student_id and orders by
+-- (created_at DESC, id DESC). Covering the listed columns lets the per-student
+-- page be served by an index-only scan; student_id stays the leading column,
+-- so this also replaces idx_events_student_created.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_student_created_desc
+    ON events (student_id, created_at DESC, id DESC)
+    INCLUDE (status, latitude, longitude, geofence_id, method);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_events_student_created;
@@ -0,0 +1,5 @@
+-- SP-GiST prefilter for point-in-polygon checks on geofences.polygon
+-- (geography, PostGIS 3+). The GiST index is kept for distance ordering.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_geofences_polygon_spgist
+    ON geofences USING SPGIST (polygon);
@@ -0,0 +1,6 @@
+-- POST /geofence upserts with ON CONFLICT (name), which needs a unique index.
+-- Fails if duplicate names already exist; merge or rename them first:
+--   SELECT name, COUNT(*) FROM geofences GROUP BY name HAVING COUNT(*) > 1;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_geofences_name
+    ON geofences (name);
@@ -0,0 +1,17 @@
+-- Index-only lookups for the presence check:
+--   students by matricule (returns id), active time windows by current time.
+-- The covering unique index takes over from the students_matricule_key
+-- constraint; ON CONFLICT (matricule) infers either.
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_students_matricule
+    ON students (matricule) INCLUDE (id);
+
+ALTER TABLE students DROP CONSTRAINT IF EXISTS students_matricule_key;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_time_windows_active
+    ON time_windows (start_time, end_time)
+    WHERE is_active;
+
+-- Refresh the visibility map and statistics so index-only scans are chosen
+VACUUM ANALYZE students;
+VACUUM ANALYZE time_windows;
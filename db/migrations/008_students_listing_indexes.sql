@@ -0,0 +1,13 @@
+-- GET /students: active students ordered by (nom, prenom), optionally
+-- filtered by a substring of matricule / nom / prenom.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_students_active_name
+    ON students (nom, prenom)
+    INCLUDE (id, matricule, is_active, created_at, updated_at)
+    WHERE is_active = true;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_students_search_trgm
+    ON students
+    USING gin ((lower(matricule) || ' ' || lower(nom) || ' ' || lower(prenom)) gin_trgm_ops);
@@ -0,0 +1,10 @@
+-- GET /students keyset pagination: (nom, prenom, id) > cursor becomes an
+-- index range scan. id moves from INCLUDE to the key as the tiebreaker,
+-- so the new index replaces idx_students_active_name.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_students_active_name_id
+    ON students (nom, prenom, id)
+    INCLUDE (matricule, is_active, created_at, updated_at)
+    WHERE is_active = true;
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_students_active_name;
@@ -0,0 +1,9 @@
+-- POST /presence/check Idempotency-Key: persisted on the event so retries
+-- are de-duplicated across workers, restarts and concurrent requests.
+-- A NULL key (header not sent) never conflicts.
+
+ALTER TABLE events ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(255);
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_events_idempotency_key
+    ON events (student_id, idempotency_key)
+    WHERE idempotency_key IS NOT NULL;
@@ -1,21 +1,24 @@
 #!/usr/bin/env python3
 """Test runner for the attendance backend."""
-import subprocess
+import os
 import sys
 
 
-def run_tests() -> int:
-    """Run the full test suite and return the exit code."""
-    completed = subprocess.run(
-        [sys.executable, "-m", "pytest", "-q"],  # run everything
-        check=False,
-    )
-    if completed.returncode == 0:
+def pytest_sessionfinish(session, exitstatus):
+    """Report the outcome; loaded into pytest as a plugin with -p run_tests."""
+    if exitstatus == 0:
         print("\n✅ All tests passed!")
     else:
-        print(f"\n❌ Tests failed with exit code {completed.returncode}")
-    return completed.returncode
+        print(f"\n❌ Tests failed with exit code {int(exitstatus)}")
+
+
+def run_tests() -> None:
+    """Replace this process with pytest running the full test suite."""
+    # the repo root holds pytest.ini and makes this module importable as a plugin
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    args = ["-q", "-p", "no:cacheprovider", "-p", "run_tests"]
+    os.execvp(sys.executable, [sys.executable, "-m", "pytest", *args])
 
 
 if __name__ == "__main__":
-    raise SystemExit(run_tests())
+    run_tests()
@@ -9,7 +9,13 @@ sys.path.insert(0, "app")
 
 def test_auth_flow():
     """Test the complete authentication flow."""
-    base_url = "http://localhost:8000"
+    # one keep-alive connection for every call instead of a new one each time
+    with requests.Session() as session:
+        return _run_auth_flow(session, "http://localhost:8000")
+
+
+def _run_auth_flow(session: requests.Session, base_url: str) -> bool:
+    """Run the authentication checks over a shared HTTP session."""
 
     print("🔐 Testing JWT Authentication Flow")
     print("=" * 50)
@@ -19,7 +25,7 @@ def test_auth_flow():
     login_data = {"username": "admin", "password": "admin123"}
 
     try:
-        response = requests.post(f"{base_url}/auth/login", json=login_data)
+        response = session.post(f"{base_url}/auth/login", json=login_data)
         if response.status_code == 200:
             token_data = response.json()
             token = token_data["access_token"]
@@ -39,7 +45,7 @@ def test_auth_flow():
     headers = {"Authorization": f"Bearer {token}"}
 
     try:
-        response = requests.get(f"{base_url}/events", headers=headers)
+        response = session.get(f"{base_url}/events", headers=headers)
         if response.status_code == 200:
             print("✅ Protected endpoint accessible with valid token")
         else:
@@ -54,7 +60,7 @@ def test_auth_flow():
     # Test 3: Access protected endpoint without token
     print("\n3. Testing protected endpoint without token...")
     try:
-        response = requests.get(f"{base_url}/events")
+        response = session.get(f"{base_url}/events")
         if response.status_code == 401:
             print("✅ Protected endpoint correctly rejects requests without token")
         else:
@@ -69,7 +75,7 @@ def test_auth_flow():
     invalid_headers = {"Authorization": "Bearer invalid_token"}
 
     try:
-        response = requests.get(f"{base_url}/events", headers=invalid_headers)
+        response = session.get(f"{base_url}/events", headers=invalid_headers)
         if response.status_code == 401:
             print("✅ Protected endpoint correctly rejects invalid token")
         else:
@@ -82,7 +88,7 @@ def test_auth_flow():
     # Test 5: Access public endpoint without token
     print("\n5. Testing public endpoint without token...")
     try:
-        response = requests.get(f"{base_url}/geofence")
+        response = session.get(f"{base_url}/geofence")
         if response.status_code == 200:
             print("✅ Public endpoint accessible without token")
         else: